@@ -0,0 +1,132 @@
+"""
+Benchmark the column normalization used by the schema `from_dataframe`
+methods against the previous chain of copy + apply helpers.
+
+    python -m benchmarks.normalize --rows 10000 100000 1000000
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.schemas.base import normalize_dataframe
+
+QUADRANT_COLUMNS = [
+    "quadrant_radius_34",
+    "quadrant_radius_50",
+    "quadrant_radius_64",
+]
+
+
+def observed_tracks_frame(n_rows, seed=0):
+    """
+    An ObservedTrack-shaped frame with realistic missing values: most points
+    have no gust or wind radii, and the radii are lists of four quadrants
+    """
+    rng = np.random.default_rng(seed)
+
+    def sparse(low, high, missing):
+        values = rng.uniform(low, high, n_rows)
+        values[rng.random(n_rows) < missing] = np.nan
+        return values
+
+    def quadrants(missing):
+        cells = rng.integers(0, 300, (n_rows, 4)).astype(float).tolist()
+        return [
+            np.nan if drop else cell
+            for cell, drop in zip(cells, rng.random(n_rows) < missing)
+        ]
+
+    return pd.DataFrame(
+        {
+            "point_id": [f"p{i}" for i in range(n_rows)],
+            "sid": [f"2024{i // 80:09d}" for i in range(n_rows)],
+            "valid_time": pd.date_range(
+                "1980-01-01", periods=n_rows, freq="3h"
+            ).astype(str),
+            "latitude": rng.uniform(-40, 40, n_rows),
+            "longitude": rng.uniform(-180, 180, n_rows),
+            "wind_speed": sparse(10, 160, 0.1),
+            "gust_speed": sparse(10, 200, 0.8),
+            "pressure": sparse(880, 1010, 0.3),
+            "max_wind_radius": sparse(5, 100, 0.6),
+            "last_closed_isobar_radius": sparse(50, 500, 0.6),
+            "last_closed_isobar_pressure": sparse(990, 1012, 0.6),
+            "basin": rng.choice(["NA", "EP", "WP", "NI", "SI", "SP"], n_rows),
+            "nature": rng.choice(["TS", "ET", "DS", "NR", None], n_rows),
+            "provider": rng.choice(["hurdat_atl", "tokyo", "reunion"], n_rows),
+            "quadrant_radius_34": quadrants(0.5),
+            "quadrant_radius_50": quadrants(0.7),
+            "quadrant_radius_64": quadrants(0.8),
+        }
+    )
+
+
+def legacy_normalize(df):
+    """
+    The previous ObservedTrack.from_dataframe preparation
+    """
+    df = df.replace({np.nan: None})
+    df = df.copy()
+    for col in ["valid_time", "created_at"]:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(
+            df[col]
+        ):
+            df[col] = pd.to_datetime(df[col], utc=True)
+    df = df.copy()
+    for col in QUADRANT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].apply(lambda x: x if isinstance(x, list) else [])
+    return df
+
+
+def normalize(df):
+    return normalize_dataframe(
+        df,
+        datetime_columns=["valid_time", "created_at"],
+        array_columns=QUADRANT_COLUMNS,
+    )
+
+
+def best_of(func, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    for n_rows in args.rows:
+        df = observed_tracks_frame(n_rows)
+        pd.testing.assert_frame_equal(
+            legacy_normalize(df), normalize(df), check_dtype=False
+        )
+        before = best_of(legacy_normalize, df, args.repeat)
+        after = best_of(normalize, df, args.repeat)
+        results.append(
+            {
+                "rows": n_rows,
+                "before_s": round(before, 3),
+                "after_s": round(after, 3),
+                "speedup": round(before / after, 1),
+            }
+        )
+        print(json.dumps(results[-1]))
+    return results
+
+
+if __name__ == "__main__":
+    main()
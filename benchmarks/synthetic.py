@@ -0,0 +1,146 @@
+"""
+Generate IBTrACS-shaped NetCDF files of configurable size.
+
+The files hold the variables `ocha_lens.ibtracs` reads, laid out like the
+real archive: one row per storm on a fixed `date_time` axis padded with
+missing values. Roughly 30% of storms are provisional (USA agency) and the
+rest best tracks (Tokyo), and every fifth storm is unnamed.
+
+    python -m benchmarks.synthetic --storms 1000 --points 40 out.nc
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Length of the date_time axis in IBTrACS v04
+DATE_TIME_LENGTH = 360
+BASINS = [b"WP", b"NA", b"SI", b"SP", b"EP", b"NI"]
+
+
+def make_ibtracs(n_storms=100, points_per_storm=40, seed=0, path=None):
+    """
+    Return a synthetic IBTrACS Dataset, and save it to `path` if given.
+
+    Each storm has `points_per_storm` 3-hourly fixes following a random walk
+    from a random genesis point in 2000-2024.
+    """
+    rng = np.random.default_rng(seed)
+    S, Q = n_storms, 4
+    T = max(DATE_TIME_LENGTH, points_per_storm)
+    dims = ("storm", "date_time")
+
+    valid = np.zeros((S, T), bool)
+    valid[:, :points_per_storm] = True
+    start = pd.Timestamp("2000-01-01") + pd.to_timedelta(
+        rng.integers(0, 25 * 365, S), "D"
+    )
+    steps = pd.to_timedelta(np.arange(points_per_storm) * 3, "h").values
+    time = np.full((S, T), np.datetime64("NaT"), "datetime64[ns]")
+    time[:, :points_per_storm] = start.values[:, None] + steps
+
+    def walk(low, high, drift):
+        origin = rng.uniform(low, high, (S, 1))
+        steps = np.cumsum(rng.normal(drift, 0.3, (S, T)), axis=1)
+        return np.where(valid, origin + steps, np.nan).astype("float32")
+
+    lat = walk(-30, 30, 0.1)
+    lon = ((walk(-180, 180, -0.3) + 180) % 360) - 180
+
+    def measure(low, high):
+        values = rng.integers(low, high, (S, T))
+        return np.where(valid, values, np.nan).astype("float32")
+
+    wind = measure(20, 150)
+    pres = measure(900, 1010)
+    radii = np.where(
+        valid[..., None], rng.integers(0, 200, (S, T, Q)), np.nan
+    ).astype("float32")
+
+    provisional = rng.random(S) < 0.3
+    season = start.year.values
+    sids = np.array(
+        [f"{season[i]}{i % 1000:03d}N{i:05d}".encode() for i in range(S)],
+        "S13",
+    )
+    names = np.array(
+        [b"UNNAMED" if i % 5 == 0 else f"STORM{i}".encode() for i in range(S)],
+        "S128",
+    )
+    atcf_ids = np.array(
+        [f"WP{i % 100:02d}{season[i]}".encode() for i in range(S)], "S8"
+    )
+
+    def per_point(values, dtype):
+        return np.where(valid, values, b"").astype(dtype)
+
+    ds = xr.Dataset(
+        {
+            "sid": ("storm", sids),
+            "season": ("storm", season.astype("int16")),
+            "number": ("storm", (np.arange(S) % 100).astype("int16")),
+            "name": ("storm", names),
+            "track_type": (
+                "storm",
+                np.where(provisional, b"PROVISIONAL", b"main").astype("S11"),
+            ),
+            "usa_atcf_id": ("storm", atcf_ids),
+            "basin": (dims, per_point(rng.choice(BASINS, (S, 1)), "S2")),
+            "nature": (dims, per_point(b"TS", "S2")),
+            "usa_agency": (
+                dims,
+                np.where(
+                    valid & provisional[:, None], b"hurdat_atl", b""
+                ).astype("S10"),
+            ),
+            "wmo_agency": (
+                dims,
+                np.where(valid & ~provisional[:, None], b"tokyo", b"").astype(
+                    "S10"
+                ),
+            ),
+            "iso_time": (dims, per_point(b"x", "S19")),
+        },
+        coords={
+            "time": (dims, time),
+            "lat": (dims, lat),
+            "lon": (dims, lon),
+        },
+    )
+    for agency in ["usa", "tokyo"]:
+        ds[f"{agency}_lat"] = (dims, lat)
+        ds[f"{agency}_lon"] = (dims, lon)
+        ds[f"{agency}_wind"] = (dims, wind)
+        ds[f"{agency}_pres"] = (dims, pres)
+        for var, value in [
+            ("gust", 10.0),
+            ("rmw", 10.0),
+            ("roci", 10.0),
+            ("poci", 1000.0),
+        ]:
+            ds[f"{agency}_{var}"] = (
+                dims,
+                np.where(valid, value, np.nan).astype("float32"),
+            )
+        for radius in ["r34", "r50", "r64"]:
+            ds[f"{agency}_{radius}"] = (dims + ("quadrant",), radii)
+
+    if path:
+        ds.to_netcdf(path)
+    return ds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--storms", type=int, default=100)
+    parser.add_argument("--points", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    make_ibtracs(args.storms, args.points, args.seed, args.path)
+
+
+if __name__ == "__main__":
+    main()
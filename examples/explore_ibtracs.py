@@ -55,30 +55,38 @@ def _(engine, pd, text):
         df_storms = pd.read_sql(
             text("select * from storms.ibtracs_storms"), con=conn
         )
+        # Summaries are refreshed by the pipeline after every load
+        df_summary = pd.read_sql(
+            text("select * from storms.ibtracs_season_basin_summary"),
+            con=conn,
+        )
         max_date = pd.read_sql(
-            "SELECT MAX(valid_time) as max_date FROM storms.ibtracs_tracks_geo",
+            "SELECT MAX(last_valid_time) as max_date "
+            "FROM storms.ibtracs_basin_track_summary",
             conn,
         )
         most_recent_date = max_date["max_date"].iloc[0].strftime("%b %d, %Y")
-    return df_storms, most_recent_date
+    return df_storms, df_summary, most_recent_date
 
 
 @app.cell
-def _(STAGE, df_storms, mo, most_recent_date):
-    df_provisional = df_storms[df_storms.provisional == True]  # noqa
-    df_best = df_storms[df_storms.provisional == False]  # noqa
+def _(STAGE, df_summary, mo, most_recent_date):
+    n_provisional = df_summary[df_summary.provisional].storms.sum()
+    n_best = df_summary[~df_summary.provisional].storms.sum()
 
     database_stage = mo.stat(value=STAGE, label="Source database")
 
-    total_storms = mo.stat(value=len(df_storms), label="Unique storms")
+    total_storms = mo.stat(
+        value=int(df_summary.storms.sum()), label="Unique storms"
+    )
 
     provisional = mo.stat(
-        value=len(df_provisional),
+        value=int(n_provisional),
         label="Provisional storms",
     )
 
     best = mo.stat(
-        value=len(df_best),
+        value=int(n_best),
         label="Best track storms",
     )
     latest = mo.stat(value=most_recent_date, label="Most recent track point")
@@ -91,12 +99,14 @@ def _(STAGE, df_storms, mo, most_recent_date):
 
 
 @app.cell
-def _(df_storms, mo, px):
-    df_basin = df_storms.groupby(["genesis_basin"]).count().reset_index()
+def _(df_summary, mo, px):
+    df_basin = (
+        df_summary.groupby(["genesis_basin"])["storms"].sum().reset_index()
+    )
     fig_basin = px.bar(
         df_basin,
         x="genesis_basin",
-        y="sid",
+        y="storms",
         template="simple_white",
         title="Storms per basin",
     )
@@ -107,11 +117,11 @@ def _(df_storms, mo, px):
         yaxis=dict(showgrid=True, gridcolor="lightgrey", title="", ticks=""),
     )
 
-    df_season = df_storms.groupby(["season"]).count().reset_index()
+    df_season = df_summary.groupby(["season"])["storms"].sum().reset_index()
     fig_season = px.line(
         df_season,
         x="season",
-        y="sid",
+        y="storms",
         template="simple_white",
         title="Storms per season",
     )
@@ -1,7 +1,8 @@
 import argparse
 import sys
 
-from src.pipelines.ibtracs import run_ibtracs
+from src.pipelines.ecmwf import run_ecmwf
+from src.pipelines.ibtracs import DATASET_TYPES, run_ibtracs
 
 
 def main():
@@ -26,10 +27,11 @@ def main():
     )
     main_parser.add_argument(
         "--dataset-type",
-        choices=["last3years", "ACTIVE", "ALL"],
-        default="last3years",
-        nargs="?",
-        help="Which dataset type to use",
+        choices=DATASET_TYPES,
+        default=["last3years"],
+        nargs="+",
+        help="Which dataset type to use. With several, ALL is downloaded "
+        "once and the others are selected from it",
     )
     main_parser.add_argument(
         "--save-dir",
@@ -40,24 +42,135 @@ def main():
     main_parser.add_argument(
         "--chunksize",
         default=10000,
+        type=int,
         nargs="?",
         help="Which chunksize to use in sql",
     )
+    main_parser.add_argument(
+        "--load-method",
+        choices=["copy", "upsert"],
+        default="copy",
+        nargs="?",
+        help="Load rows with COPY and a set-based merge, or row upserts",
+    )
+    main_parser.add_argument(
+        "--batch-size",
+        default=None,
+        type=int,
+        nargs="?",
+        help="Number of storms to process at a time (default: all at once)",
+    )
+    main_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process storms that changed since the last run",
+    )
+    main_parser.add_argument(
+        "--conditional",
+        action="store_true",
+        help="Skip the run if the source file is unchanged upstream",
+    )
+    main_parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        nargs="?",
+        help="Number of concurrent database writers",
+    )
+    main_parser.add_argument(
+        "--processes",
+        default=None,
+        type=int,
+        nargs="?",
+        help="Number of processes to extract or parse with (default: 1 for "
+        "ibtracs, all cores for ecmwf)",
+    )
+    main_parser.add_argument(
+        "--shard-by",
+        choices=["season", "range"],
+        default="season",
+        nargs="?",
+        help="Split storms by season, or in ranges of --batch-size storms",
+    )
+
+    main_parser.add_argument(
+        "--cache-size",
+        default=0,
+        type=float,
+        nargs="?",
+        help="Size in GB of the cache of extracted frames (default: off)",
+    )
+
+    main_parser.add_argument(
+        "--metrics-report",
+        default=None,
+        nargs="?",
+        help="Write a JSON report of per-stage metrics to this path",
+    )
+    main_parser.add_argument(
+        "--prometheus-textfile",
+        default=None,
+        nargs="?",
+        help="Write per-stage metrics in Prometheus text format to this path",
+    )
+    main_parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Record the peak Python memory of each stage with tracemalloc",
+    )
+    main_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume a failed run from its checkpoint in --save-dir",
+    )
+    main_parser.add_argument(
+        "--tile-cache",
+        default=None,
+        nargs="?",
+        help="Directory of cached vector tiles to invalidate for changed "
+        "storms",
+    )
+    main_parser.add_argument(
+        "--input-dir",
+        default=None,
+        nargs="?",
+        help="Directory of cxml files to load (ecmwf)",
+    )
 
     args, remaining_args = main_parser.parse_known_args()
     sys.argv = [sys.argv[0]] + remaining_args
 
     if args.pipeline == "ibtracs":
         run_ibtracs(
-            args.mode,
-            args.dataset_type,
-            args.save_to_blob,
-            args.save_dir,
-            args.chunksize,
+            mode=args.mode,
+            dataset_type=args.dataset_type,
+            save_to_blob=args.save_to_blob,
+            save_dir=args.save_dir,
+            chunksize=args.chunksize,
+            load_method=args.load_method,
+            batch_size=args.batch_size,
+            incremental=args.incremental,
+            conditional=args.conditional,
+            workers=args.workers,
+            processes=args.processes or 1,
+            shard_by=args.shard_by,
+            cache_size=args.cache_size,
+            metrics_report=args.metrics_report,
+            prometheus_textfile=args.prometheus_textfile,
+            trace_memory=args.trace_memory,
+            resume=args.resume,
+            tile_cache=args.tile_cache,
         )
     elif args.pipeline == "ecmwf":
-        # TODO
-        raise NotImplementedError()
+        if args.input_dir is None:
+            main_parser.error("the ecmwf pipeline requires --input-dir")
+        run_ecmwf(
+            mode=args.mode,
+            input_dir=args.input_dir,
+            processes=args.processes,
+            batch_size=args.batch_size,
+            chunksize=args.chunksize,
+        )
     else:
         raise ValueError(f"Unknown pipeline: {args.pipeline}")
 
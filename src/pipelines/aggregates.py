@@ -0,0 +1,61 @@
+"""
+Per-storm aggregates of track points, stored on the storm records so storms
+can be listed, filtered and ranked without scanning the track tables
+"""
+
+import pandas as pd
+
+AGGREGATE_COLUMNS = [
+    "peak_wind",
+    "min_pressure",
+    "first_valid_time",
+    "last_valid_time",
+    "duration_hours",
+    "basins",
+]
+
+
+def storm_aggregates(tracks, by="sid"):
+    """
+    Aggregate track points per storm with a single groupby on `by`: peak
+    wind speed, minimum pressure, first and last valid time, duration in
+    hours, and the basins crossed in the order they appear.
+
+    Returns a DataFrame indexed by `by`, empty if `tracks` is.
+    """
+    if tracks.empty:
+        # Batches without tracks come as frames of untyped columns
+        return pd.DataFrame(
+            columns=AGGREGATE_COLUMNS, index=pd.Index([], dtype=str, name=by)
+        )
+    aggregates = tracks.groupby(by, observed=True, sort=False).agg(
+        peak_wind=("wind_speed", "max"),
+        min_pressure=("pressure", "min"),
+        first_valid_time=("valid_time", "min"),
+        last_valid_time=("valid_time", "max"),
+        basins=("basin", "unique"),
+    )
+    aggregates["duration_hours"] = (
+        aggregates["last_valid_time"] - aggregates["first_valid_time"]
+    ).dt.total_seconds() / 3600
+    # Plain lists of str, which both COPY and psycopg2 write as arrays
+    aggregates["basins"] = [
+        [str(basin) for basin in basins if pd.notna(basin)]
+        for basins in aggregates["basins"]
+    ]
+    aggregates.index = aggregates.index.astype(str)
+    return aggregates[AGGREGATE_COLUMNS]
+
+
+def add_storm_aggregates(storms, tracks, by="sid"):
+    """
+    Add the aggregates of `tracks` to each storm in `storms`. Storms without
+    track points get missing values
+    """
+    storms = storms.drop(columns=AGGREGATE_COLUMNS, errors="ignore")
+    return storms.merge(
+        storm_aggregates(tracks, by),
+        left_on=by,
+        right_index=True,
+        how="left",
+    )
@@ -0,0 +1,66 @@
+"""
+Streaming, resumable upload of large files to Azure blob storage
+"""
+
+import base64
+import os
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobBlock, ContentSettings
+
+BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def _block_ids(file_path):
+    """
+    Yield block ids derived from the file's size and modification time, so
+    blocks staged by an interrupted upload of the same file can be reused
+    """
+    stat = os.stat(file_path)
+    prefix = f"{stat.st_size:016d}{int(stat.st_mtime):016d}"
+    index = 0
+    while True:
+        raw = f"{prefix}{index:08d}"
+        yield base64.b64encode(raw.encode()).decode()
+        index += 1
+
+
+def upload_file_in_blocks(
+    file_path,
+    blob_name,
+    container_client,
+    block_size=BLOCK_SIZE,
+    content_type="application/octet-stream",
+):
+    """
+    Upload a file as a block blob, reading and staging `block_size` bytes at
+    a time before committing the block list.
+
+    Blocks left uncommitted by a previous failed upload of the same file are
+    not sent again, so a rerun resumes after the last staged block.
+
+    Returns the number of blocks that had to be uploaded.
+    """
+    blob_client = container_client.get_blob_client(blob_name)
+    try:
+        _, uncommitted = blob_client.get_block_list("uncommitted")
+        staged = {block.id: block.size for block in uncommitted}
+    except ResourceNotFoundError:
+        staged = {}
+
+    block_ids = _block_ids(file_path)
+    block_list = []
+    uploaded = 0
+    with open(file_path, "rb") as f:
+        while chunk := f.read(block_size):
+            block_id = next(block_ids)
+            if staged.get(block_id) != len(chunk):
+                blob_client.stage_block(block_id, chunk)
+                uploaded += 1
+            block_list.append(BlobBlock(block_id=block_id))
+
+    blob_client.commit_block_list(
+        block_list,
+        content_settings=ContentSettings(content_type=content_type),
+    )
+    return uploaded
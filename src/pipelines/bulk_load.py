@@ -0,0 +1,247 @@
+"""
+Bulk loading of DataFrames into Postgres using COPY and a set-based upsert
+"""
+
+import io
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+HASH_COLUMN = "row_hash"
+
+
+class MergeCounts(NamedTuple):
+    """
+    Outcome of a merge: rows that were new, changed, or left as they were
+    """
+
+    inserted: int
+    updated: int
+    unchanged: int
+    # Values of the `changed_column` asked for in rows inserted or updated
+    changed: Optional[frozenset] = None
+
+    @property
+    def rows(self):
+        return self.inserted + self.updated + self.unchanged
+
+    @classmethod
+    def from_merge(cls, rows, existing, merged, changed=None):
+        """
+        Counts of a merge of `rows` rows, `existing` of which matched rows
+        already in the table, that wrote `merged` of them: the rest matched
+        rows with the same hash
+        """
+        inserted = rows - existing
+        return cls(inserted, merged - inserted, rows - merged, changed)
+
+
+def add_row_hash(df, exclude=()):
+    """
+    Add a `row_hash` column with a 64-bit hash of each row's content, so
+    unchanged rows can be skipped when merging. Columns in `exclude`, e.g.
+    generated identifiers, don't count as changes.
+
+    Geometries are hashed by their WKB and list-like cells by their array
+    literal. The hash of a row doesn't depend on the other rows in the
+    frame, but does on the dtypes as well as the values, so it has to be
+    computed on frames as extracted, before any dtype changes.
+    """
+
+    def hashable(series):
+        if series.dtype.name == "geometry":
+            return series.to_wkb(hex=True)
+        if series.dtype == object:
+            # Built as object so pandas doesn't infer a dtype from the
+            # other rows: an all-missing column would become float64 and
+            # hash differently from the same cells among strings
+            return pd.Series(
+                [
+                    (
+                        _format_array(x)
+                        if isinstance(x, (list, tuple, np.ndarray))
+                        else x
+                    )
+                    for x in series
+                ],
+                index=series.index,
+                dtype=object,
+            )
+        return series
+
+    # In a fixed order, as frames extracted from different sets of storms
+    # may not have their columns in the same order
+    columns = sorted(c for c in df.columns if c not in (HASH_COLUMN, *exclude))
+    hashable = pd.DataFrame(
+        {col: hashable(df[col]) for col in columns}, index=df.index
+    )
+    hashes = pd.util.hash_pandas_object(hashable, index=False)
+    # Stored in a BIGINT column, so reinterpret the unsigned hashes as signed
+    df[HASH_COLUMN] = hashes.to_numpy().view("int64")
+    return df
+
+
+def _format_array(values):
+    """
+    Format a list-like cell as a Postgres array literal
+    """
+    items = ["NULL" if pd.isna(v) else str(v) for v in values]
+    return "{" + ",".join(items) + "}"
+
+
+def prepare_copy_frame(df):
+    """
+    Prepare a DataFrame to be serialized as CSV for COPY.
+
+    Float columns that only hold whole numbers are cast to nullable integers
+    so they can be copied into INTEGER columns, and list-like cells are
+    rendered as Postgres array literals (as psycopg2 would do for to_sql).
+    """
+    df = df.copy()
+    for col in df.select_dtypes(include="float").columns:
+        values = df[col].dropna()
+        if len(values) and (values == np.round(values)).all():
+            df[col] = df[col].astype("Int64")
+    for col in df.select_dtypes(include="object").columns:
+        is_array = df[col].map(
+            lambda x: isinstance(x, (list, tuple, np.ndarray))
+        )
+        if is_array.any():
+            df.loc[is_array, col] = df.loc[is_array, col].map(_format_array)
+    return df
+
+
+def copy_buffer(df):
+    """
+    Serialize a frame prepared with `prepare_copy_frame` as CSV for COPY
+    ... WITH (FORMAT csv), where missing values are empty unquoted fields,
+    i.e. NULL
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_upsert(
+    df,
+    engine,
+    table,
+    conflict_columns,
+    schema="storms",
+    chunksize=10000,
+    constraint=None,
+    staging_types=None,
+    expressions=None,
+    merges=None,
+    changed_column=None,
+):
+    """
+    Upsert a DataFrame into `schema.table` using COPY and a single merge.
+
+    The frame is streamed in chunks of `chunksize` rows into a temporary
+    (and therefore unlogged) staging table with COPY FROM STDIN, then merged
+    into the target table with one INSERT ... ON CONFLICT DO UPDATE, all in
+    the same transaction. Rows are deduplicated on `conflict_columns` first,
+    keeping the last occurrence, as a single statement can't update the
+    same row twice.
+
+    If the frame has a `row_hash` column (see `add_row_hash`), existing
+    rows are only rewritten when their hash differs, which saves the WAL
+    and dead tuples of no-op updates.
+
+    Columns that only exist in the staging table are declared with their
+    SQL type in `staging_types`, and `expressions` maps target columns to
+    SQL expressions over the staging columns that are evaluated during the
+    merge (e.g. to build geometries in the database). `merges` maps target
+    columns to SQL expressions that replace the plain overwrite on conflict,
+    combining the existing row (`target`) with the new one (`EXCLUDED`),
+    e.g. to keep a running maximum.
+
+    Returns the MergeCounts of inserted, updated and unchanged rows, with
+    the distinct values of `changed_column` (e.g. the storm) in rows that
+    were inserted or updated if given.
+    """
+    constraint = constraint or f"{table}_unique"
+    staging_types = staging_types or {}
+    expressions = expressions or {}
+    merges = merges or {}
+    df = df.drop_duplicates(subset=conflict_columns, keep="last")
+    df = prepare_copy_frame(df)
+
+    copy_columns = ", ".join(f'"{col}"' for col in df.columns)
+    target_columns = [col for col in df.columns if col not in staging_types]
+    staging_select = [f'"{col}"' for col in target_columns] + [
+        f'NULL::{sql_type} AS "{col}"'
+        for col, sql_type in staging_types.items()
+    ]
+    insert_columns = target_columns + list(expressions)
+    insert_list = ", ".join(f'"{col}"' for col in insert_columns)
+    values = [f'"{col}"' for col in target_columns] + list(
+        expressions.values()
+    )
+    merges = {
+        col: merges.get(col, f'EXCLUDED."{col}"') for col in insert_columns
+    }
+    updates = ", ".join(
+        f'"{col}" = {merges[col]}'
+        for col in insert_columns
+        if col not in conflict_columns
+    )
+    condition = ""
+    if HASH_COLUMN in target_columns:
+        condition = (
+            f'WHERE target."{HASH_COLUMN}" '
+            f'IS DISTINCT FROM EXCLUDED."{HASH_COLUMN}"'
+        )
+    staging = f"_staging_{table}"
+
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                f"SELECT {', '.join(staging_select)} "
+                f"FROM {schema}.{table} WITH NO DATA"
+            )
+        )
+        cursor = conn.connection.cursor()
+        for i in range(0, len(df), chunksize):
+            cursor.copy_expert(
+                f"COPY {staging} ({copy_columns}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                copy_buffer(df.iloc[i : i + chunksize]),
+            )
+        # Rows that already exist are the ones that will conflict. xmax
+        # can't tell inserts from updates here, as it isn't available on
+        # partitioned tables
+        matches = " AND ".join(
+            f's."{col}" = t."{col}"' for col in conflict_columns
+        )
+        existing = conn.execute(
+            text(
+                f"SELECT count(*) FROM {staging} s "
+                f"JOIN {schema}.{table} t ON {matches}"
+            )
+        ).scalar()
+        returning, changed = "1", "NULL"
+        if changed_column is not None:
+            returning = f'target."{changed_column}"'
+            changed = f'array_agg(DISTINCT "{changed_column}")'
+        # Rows skipped by the condition aren't returned
+        merged, changed = conn.execute(
+            text(
+                f"WITH merged AS ("
+                f"INSERT INTO {schema}.{table} AS target ({insert_list}) "
+                f"SELECT {', '.join(values)} FROM {staging} "
+                f"ON CONFLICT ON CONSTRAINT {constraint} "
+                f"DO UPDATE SET {updates} {condition} "
+                f"RETURNING {returning}) "
+                f"SELECT count(*), {changed} FROM merged"
+            )
+        ).one()
+
+    if changed_column is not None:
+        changed = frozenset(changed or [])
+    return MergeCounts.from_merge(len(df), existing, merged, changed)
@@ -0,0 +1,133 @@
+"""
+On-disk cache of extracted IBTrACS frames, stored as Parquet / GeoParquet
+"""
+
+import hashlib
+import os
+import uuid
+
+import geopandas as gpd
+import numpy as np
+import ocha_lens as lens
+import pandas as pd
+
+from src.pipelines.download import read_manifest
+
+CACHE_SUFFIXES = (".storms.parquet", ".tracks.parquet")
+# Version of the extracted frames' layout (columns added by the pipeline,
+# such as row hashes and storm aggregates). Bumping it invalidates entries
+CACHE_FORMAT = 2
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """
+    Return the SHA-256 of a file, taken from its download manifest when that
+    still describes the file on disk
+    """
+    manifest = read_manifest(file_path, pending=True)
+    if manifest.get("sha256") and manifest.get("size") == os.path.getsize(
+        file_path
+    ):
+        return manifest["sha256"]
+
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def cache_key(file_hash, sids):
+    """
+    Key extracted frames by the source file's content, the ocha-lens version
+    that extracted them, the cache format, and the storms they were
+    extracted for
+    """
+    key = hashlib.sha256()
+    key.update(file_hash.encode())
+    key.update(lens.__version__.encode())
+    key.update(f"format={CACHE_FORMAT}".encode())
+    for sid in sids:
+        key.update(str(sid).encode() + b"\0")
+    return key.hexdigest()
+
+
+def _paths(cache_dir, key):
+    return [os.path.join(cache_dir, key + suffix) for suffix in CACHE_SUFFIXES]
+
+
+def _to_lists(df):
+    """
+    Parquet returns list cells as arrays; restore the lists ocha-lens makes
+    """
+    for col in df.select_dtypes(include="object").columns:
+        df[col] = [
+            x.tolist() if isinstance(x, np.ndarray) else x for x in df[col]
+        ]
+    return df
+
+
+def load_extracted(cache_dir, key):
+    """
+    Return the cached (storms, tracks) for `key`, or None on a miss.
+
+    A hit marks the entry as recently used for eviction.
+    """
+    storms_path, tracks_path = _paths(cache_dir, key)
+    try:
+        storms = pd.read_parquet(storms_path)
+        tracks = gpd.read_parquet(tracks_path)
+        for path in (storms_path, tracks_path):
+            os.utime(path)
+    except (FileNotFoundError, ValueError):
+        # Missing, or evicted by another process while being read
+        return None
+    return _to_lists(storms), _to_lists(tracks)
+
+
+def save_extracted(cache_dir, key, storms, tracks, max_bytes):
+    """
+    Store (storms, tracks) under `key`, then evict least recently used
+    entries until the cache fits in `max_bytes`
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    for df, path in zip([storms, tracks], _paths(cache_dir, key)):
+        # Write under a unique name first so readers never see partial files
+        part_path = f"{path}.{uuid.uuid4().hex}.part"
+        df.to_parquet(part_path, index=False)
+        os.replace(part_path, path)
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir, max_bytes):
+    """
+    Delete the least recently used entries until the total size of the cache
+    is at most `max_bytes`. Returns the number of entries deleted.
+    """
+    entries = {}
+    for name in os.listdir(cache_dir):
+        for suffix in CACHE_SUFFIXES:
+            if name.endswith(suffix):
+                try:
+                    stat = os.stat(os.path.join(cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                size, used = entries.get(name[: -len(suffix)], (0, 0))
+                entries[name[: -len(suffix)]] = (
+                    size + stat.st_size,
+                    max(used, stat.st_mtime),
+                )
+
+    total = sum(size for size, _ in entries.values())
+    evicted = 0
+    for key, (size, _) in sorted(entries.items(), key=lambda e: e[1][1]):
+        if total <= max_bytes:
+            break
+        for path in _paths(cache_dir, key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        evicted += 1
+    return evicted
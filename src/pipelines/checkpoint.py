@@ -0,0 +1,130 @@
+"""
+Durable checkpoints of pipeline runs, so a failed run can be resumed
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+def unit_key(sids):
+    """
+    Identify a unit of work (a batch or shard of storms) by its storms, so
+    it is recognised however the storms are split up on the next run
+    """
+    # The NetCDF holds sids as bytes, extracted frames as str
+    sids = [s.decode() if isinstance(s, bytes) else str(s) for s in sids]
+    digest = hashlib.sha1("\0".join(sorted(sids)).encode())
+    return digest.hexdigest()[:16]
+
+
+class Checkpoint:
+    """
+    Progress of a run, stored as JSON in `path` and rewritten atomically
+    after every change:
+
+    - stages: completed one-off stages (download, blob upload), with details
+    - units: keys of batches or shards whose writes are all committed
+    - chunks: per table and unit, the indices of committed chunks of
+      `chunksize` rows
+
+    Unless `resume` is set, any previous progress in `path` is discarded,
+    and so are committed chunks recorded with another `chunksize` and all
+    progress once another file is downloaded (see `complete_download`).
+    """
+
+    def __init__(self, path, chunksize, resume=False):
+        self.path = path
+        self.chunksize = chunksize
+        self._lock = threading.Lock()
+        self.state = {
+            "chunksize": chunksize,
+            "stages": {},
+            "units": [],
+            "chunks": {},
+        }
+        if resume and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+            if self.state["chunksize"] != chunksize:
+                # Chunk indices only mean something for the same chunk size
+                self.state["chunksize"] = chunksize
+                self.state["chunks"] = {}
+        self._units = set(self.state["units"])
+        self._save()
+
+    def _save(self):
+        part_path = f"{self.path}.part"
+        with open(part_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(part_path, self.path)
+
+    def stage(self, name):
+        """
+        Details recorded when stage `name` completed, or None
+        """
+        return self.state["stages"].get(name)
+
+    def complete_stage(self, name, **details):
+        with self._lock:
+            self.state["stages"][name] = details
+            self._save()
+
+    def downloaded_file(self):
+        """
+        Path of the file downloaded by the checkpointed run, if it is still
+        there unchanged
+        """
+        download = self.stage("download")
+        if not download or not os.path.exists(download["path"]):
+            return None
+        stat = os.stat(download["path"])
+        if stat.st_size != download["size"]:
+            return None
+        if stat.st_mtime != download["mtime"]:
+            return None
+        return download["path"]
+
+    def complete_download(self, path):
+        """
+        Record the download of the file at `path`. Any progress made on the
+        file checkpointed before is discarded, as it was another file or
+        the same one since changed
+        """
+        stat = os.stat(path)
+        with self._lock:
+            self.state.update(stages={}, units=[], chunks={})
+            self._units = set()
+        self.complete_stage(
+            "download", path=path, size=stat.st_size, mtime=stat.st_mtime
+        )
+
+    def unit_done(self, unit):
+        return unit in self._units
+
+    def complete_unit(self, unit):
+        with self._lock:
+            self._units.add(unit)
+            self.state["units"].append(unit)
+            for chunks in self.state["chunks"].values():
+                chunks.pop(unit, None)
+            self._save()
+
+    def committed_chunks(self, table, unit):
+        return set(self.state["chunks"].get(table, {}).get(unit, []))
+
+    def commit_chunk(self, table, unit, index):
+        with self._lock:
+            chunks = self.state["chunks"].setdefault(table, {})
+            chunks.setdefault(unit, []).append(index)
+            self._save()
+
+    def clear(self):
+        """
+        Remove the checkpoint once the run has finished
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
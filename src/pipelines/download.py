@@ -0,0 +1,138 @@
+"""
+Conditional HTTP downloads tracked by a manifest stored next to the file
+"""
+
+import hashlib
+import json
+import os
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+IBTRACS_BASE_URL = (
+    "https://www.ncei.noaa.gov/data/"
+    "international-best-track-archive-for-climate-stewardship-ibtracs/"
+    "v04r01/access/netcdf"
+)
+
+
+def manifest_path(file_path):
+    return f"{file_path}.manifest.json"
+
+
+def pending_manifest_path(file_path):
+    return f"{file_path}.manifest.pending.json"
+
+
+def read_manifest(file_path, pending=False):
+    """
+    Return the manifest recorded for `file_path`, or an empty dict if the
+    file or its manifest is missing. With `pending`, the manifest of a
+    download that wasn't committed yet is returned in preference, as that
+    is the one describing the file on disk
+    """
+    paths = [manifest_path(file_path)]
+    if pending:
+        paths.insert(0, pending_manifest_path(file_path))
+    if not os.path.exists(file_path):
+        return {}
+    for path in paths:
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+    return {}
+
+
+def write_manifest(file_path, manifest, pending=False):
+    if pending:
+        path = pending_manifest_path(file_path)
+    else:
+        path = manifest_path(file_path)
+    with open(f"{path}.part", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.part", path)
+
+
+def commit_manifest(file_path):
+    """
+    Make the manifest of the last download of `file_path` the one future
+    conditional requests are made with, once its content was loaded. Until
+    then, the previous validators are sent and a failed load is retried on
+    the next run. Returns whether there was a pending manifest
+    """
+    try:
+        os.replace(pending_manifest_path(file_path), manifest_path(file_path))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def conditional_download(url, file_path, chunk_size=1024 * 1024):
+    """
+    Download `url` to `file_path` unless the source is unchanged.
+
+    The ETag and Last-Modified headers from the previous download are sent
+    as If-None-Match / If-Modified-Since. If the server still sends the file,
+    its SHA-256 is compared with the manifest so re-published but identical
+    content also counts as unchanged. The body is streamed to a `.part` file
+    and only moved into place once complete.
+
+    The manifest of new content is left pending until `commit_manifest` is
+    called after it was loaded, so a failed load doesn't make the next
+    conditional request report the source as unchanged.
+
+    Returns True if `file_path` has new content, False otherwise.
+    """
+    manifest = read_manifest(file_path)
+    request = urllib.request.Request(url)
+    if manifest.get("etag"):
+        request.add_header("If-None-Match", manifest["etag"])
+    if manifest.get("last_modified"):
+        request.add_header("If-Modified-Since", manifest["last_modified"])
+
+    try:
+        response = urllib.request.urlopen(request)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return False
+        raise
+
+    part_path = f"{file_path}.part"
+    sha256 = hashlib.sha256()
+    size = 0
+    with response, open(part_path, "wb") as f:
+        while chunk := response.read(chunk_size):
+            sha256.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+        headers = response.headers
+
+    # Changed since the last load, though a failed run may have left this
+    # content on disk already
+    changed = sha256.hexdigest() != manifest.get("sha256")
+    on_disk = read_manifest(file_path, pending=True).get("sha256")
+    if sha256.hexdigest() != on_disk:
+        os.replace(part_path, file_path)
+    else:
+        os.remove(part_path)
+
+    write_manifest(
+        file_path,
+        {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "sha256": sha256.hexdigest(),
+            "size": size,
+            "downloaded_at": datetime.now(timezone.utc).isoformat(),
+        },
+        pending=changed,
+    )
+    if not changed:
+        # Identical content: nothing to load, and any download left pending
+        # by a failed run is superseded
+        try:
+            os.remove(pending_manifest_path(file_path))
+        except FileNotFoundError:
+            pass
+    return changed
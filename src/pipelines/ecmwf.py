@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+ECMWF ETL pipeline, for TIGGE cyclone XML (cxml) forecast tracks
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import coloredlogs
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+import ocha_stratus as stratus  # noqa
+from src.pipelines.aggregates import add_storm_aggregates  # noqa
+from src.pipelines.bulk_load import copy_upsert  # noqa
+from src.pipelines.track_lines import build_forecast_lines  # noqa
+from src.schemas import ForecastTrack, Storm, init_db  # noqa
+from src.schemas.database import ensure_partitions, execute_sql_file  # noqa
+
+
+logger = logging.getLogger(__name__)
+
+MS_TO_KNOTS = 1.943844
+
+# cxml <data type=...> of the forecasts to load; analyses are skipped
+PROVIDERS = {"forecast": "ECMWF-HRES", "ensembleForecast": "ECMWF-ENS"}
+
+# cxml basin names, lower case without punctuation, to IBTrACS basin codes
+BASINS = {
+    "north atlantic": "NA",
+    "northeast pacific": "EP",
+    "north east pacific": "EP",
+    "central pacific": "EP",
+    "northwest pacific": "WP",
+    "north west pacific": "WP",
+    "north indian": "NI",
+    "southwest indian": "SI",
+    "south west indian": "SI",
+    "south indian": "SI",
+    "australian region": "SP",
+    "southwest pacific": "SP",
+    "south west pacific": "SP",
+    "south pacific": "SP",
+    "south atlantic": "SA",
+}
+SOUTHERN_BASINS = {"SI", "SP", "SA"}
+
+# A storm's forecasts span several batches of files, so its aggregates are
+# combined with those already stored rather than overwritten
+STORM_MERGES = {
+    "peak_wind": "GREATEST(target.peak_wind, EXCLUDED.peak_wind)",
+    "min_pressure": "LEAST(target.min_pressure, EXCLUDED.min_pressure)",
+    "first_valid_time": (
+        "LEAST(target.first_valid_time, EXCLUDED.first_valid_time)"
+    ),
+    "last_valid_time": (
+        "GREATEST(target.last_valid_time, EXCLUDED.last_valid_time)"
+    ),
+    "duration_hours": (
+        "EXTRACT(EPOCH FROM "
+        "GREATEST(target.last_valid_time, EXCLUDED.last_valid_time) - "
+        "LEAST(target.first_valid_time, EXCLUDED.first_valid_time)) / 3600"
+    ),
+    "basins": (
+        "ARRAY(SELECT basin FROM unnest(target.basins || EXCLUDED.basins) "
+        "WITH ORDINALITY AS u(basin, i) GROUP BY basin ORDER BY min(i))"
+    ),
+}
+
+TRACK_COLUMNS = [
+    "storm_id",
+    "issue_time",
+    "valid_time",
+    "latitude",
+    "longitude",
+    "wind_speed",
+    "pressure",
+    "basin",
+    "provider",
+    "ensemble_member",
+]
+CONFLICT_COLUMNS = [
+    "storm_id",
+    "issue_time",
+    "valid_time",
+    "provider",
+    "ensemble_member",
+]
+
+FILES_PER_BATCH = 500
+
+# Forecast tracks table from before partitioning, renamed by the
+# forecast_tracks_legacy migration
+LEGACY_TABLE = "forecast_tracks_legacy"
+
+
+def find_cxml_files(input_dir):
+    """
+    Return the cxml files under `input_dir`, in a stable order
+    """
+    input_dir = Path(input_dir)
+    files = [*input_dir.rglob("*.xml"), *input_dir.rglob("*.cxml")]
+    return sorted(str(f) for f in files)
+
+
+def basin_code(name):
+    if not name:
+        return None
+    key = " ".join(name.lower().replace("-", " ").split())
+    return BASINS.get(key)
+
+
+def storm_season(basin, issue_time):
+    """
+    Seasons follow IBTrACS: in the southern hemisphere a season runs from
+    July to June and is named after the year it ends in
+    """
+    if basin in SOUTHERN_BASINS and issue_time.month >= 7:
+        return issue_time.year + 1
+    return issue_time.year
+
+
+def _is_named(name):
+    # Unnamed disturbances are reported with numeric ids such as "90W"
+    return bool(name) and not name.strip()[0].isdigit()
+
+
+def _value(element, path):
+    """
+    Return the value at `path` as a float and its units attribute
+    """
+    node = element.find(path)
+    if node is None or not (node.text or "").strip():
+        return np.nan, ""
+    return float(node.text), node.get("units", "")
+
+
+def _coordinate(fix, name, negative):
+    value, units = _value(fix, name)
+    if negative in units:
+        value = -value
+    return value
+
+
+def parse_cxml(path):
+    """
+    Parse the named storm forecasts in a cxml file into ForecastTrack rows.
+
+    Wind speeds are converted from m/s to knots and longitudes to
+    [-180, 180). Fixes without a position or wind speed are dropped.
+    """
+    root = ET.parse(path).getroot()
+    issue_time = pd.Timestamp(root.findtext("header/baseTime"))
+
+    rows = []
+    for data in root.iter("data"):
+        provider = PROVIDERS.get(data.get("type"))
+        if provider is None:
+            continue
+        member = int(data.get("member") or 0)
+        for disturbance in data.iter("disturbance"):
+            name = disturbance.findtext("cycloneName")
+            basin = basin_code(disturbance.findtext("basin"))
+            if not _is_named(name) or basin is None:
+                continue
+            name = name.strip().upper()
+            season = storm_season(basin, issue_time)
+            storm_id = f"{name.lower()}_{basin.lower()}_{season}"
+            for fix in disturbance.iter("fix"):
+                wind_speed, units = _value(
+                    fix, "cycloneData/maximumWind/speed"
+                )
+                if units.lower() in ("m/s", "m s-1", "m s**-1"):
+                    wind_speed *= MS_TO_KNOTS
+                rows.append(
+                    {
+                        "storm_id": storm_id,
+                        "name": name,
+                        "season": season,
+                        "issue_time": issue_time,
+                        "valid_time": fix.findtext("validTime"),
+                        "latitude": _coordinate(fix, "latitude", "S"),
+                        "longitude": _coordinate(fix, "longitude", "W"),
+                        "wind_speed": wind_speed,
+                        "pressure": _value(
+                            fix, "cycloneData/minimumPressure/pressure"
+                        )[0],
+                        "basin": basin,
+                        "provider": provider,
+                        "ensemble_member": member,
+                    }
+                )
+
+    df = pd.DataFrame(rows, columns=TRACK_COLUMNS + ["name", "season"])
+    df = df.dropna(
+        subset=["valid_time", "latitude", "longitude", "wind_speed"]
+    )
+    for col in ["issue_time", "valid_time"]:
+        df[col] = pd.to_datetime(df[col], utc=True).dt.tz_localize(None)
+    df["longitude"] = (df["longitude"] + 180) % 360 - 180
+    df["wind_speed"] = df["wind_speed"].round(1)
+    return df
+
+
+def _parse_file(path):
+    """
+    Parse one file in a worker process, returning None for unreadable files
+    so that one bad file doesn't abort the whole run
+    """
+    try:
+        return parse_cxml(path)
+    except (ET.ParseError, ValueError):
+        return None
+
+
+def iter_parsed_batches(files, processes, batch_size=FILES_PER_BATCH):
+    """
+    Parse files in a process pool, yielding one DataFrame of forecast rows
+    per `batch_size` files
+    """
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=context
+    ) as pool:
+        for start in range(0, len(files), batch_size):
+            batch = files[start : start + batch_size]
+            logger.info(
+                f"Parsing files {start} to {start + len(batch)} "
+                f"of {len(files)}..."
+            )
+            chunksize = max(1, len(batch) // (4 * processes))
+            frames = []
+            for path, df in zip(
+                batch, pool.map(_parse_file, batch, chunksize=chunksize)
+            ):
+                if df is None:
+                    logger.warning(f"Skipping unreadable file {path}")
+                elif len(df):
+                    frames.append(df)
+            if frames:
+                yield pd.concat(frames, ignore_index=True)
+
+
+def extract_storms(tracks):
+    """
+    One Storm row per storm_id, described by its earliest forecast fix and
+    the aggregates of all its forecast points. ECMWF has no IBTrACS sid, so
+    the storm_id stands in for it
+    """
+    storms = (
+        tracks.sort_values(["issue_time", "valid_time"])
+        .groupby("storm_id", as_index=False)
+        .first()[["storm_id", "name", "season", "basin"]]
+        .rename(columns={"basin": "genesis_basin"})
+    )
+    storms["sid"] = storms["storm_id"]
+    return add_storm_aggregates(storms, tracks, by="storm_id")
+
+
+def write_forecasts(tracks, engine, chunksize=10000):
+    """
+    Upsert the storms and forecast tracks in `tracks`, and rebuild the
+    lines of their forecasts. Storms go first, as forecast tracks reference
+    them
+    """
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        with conn.begin():
+            ensure_partitions(
+                conn, ForecastTrack, tracks["issue_time"].dt.year.unique()
+            )
+    storms = copy_upsert(
+        extract_storms(tracks),
+        engine,
+        table=Storm.__tablename__,
+        conflict_columns=["storm_id"],
+        chunksize=chunksize,
+        constraint="uq_storm_id",
+        merges=STORM_MERGES,
+    ).rows
+    rows = copy_upsert(
+        tracks[TRACK_COLUMNS],
+        engine,
+        table=ForecastTrack.__tablename__,
+        conflict_columns=CONFLICT_COLUMNS,
+        chunksize=chunksize,
+        constraint="uq_forecast_track",
+    ).rows
+    lines = build_forecast_lines(engine, tracks)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Wrote {storms} storms, {rows} forecast points and {lines} track "
+        f"lines in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)."
+    )
+    return rows
+
+
+def move_legacy_forecasts(engine):
+    """
+    Move the rows of the forecast tracks table renamed by the
+    forecast_tracks_legacy migration into storms.forecast_tracks, as
+    deterministic forecasts (ensemble member 0), build their lines and drop
+    it. Returns the number of rows moved
+    """
+    table = ForecastTrack.__table__
+    with engine.begin() as conn:
+        legacy_columns = set(
+            conn.execute(
+                text(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_schema = 'storms' AND table_name = :table"
+                ),
+                {"table": LEGACY_TABLE},
+            ).scalars()
+        )
+        if not legacy_columns:
+            return 0
+
+        logger.info(f"Moving forecast tracks from storms.{LEGACY_TABLE}...")
+        # New ids are drawn, and ensemble_member takes its default
+        columns = ", ".join(
+            col.name
+            for col in table.columns
+            if col.name != "id" and col.name in legacy_columns
+        )
+        years = conn.execute(
+            text(
+                "SELECT DISTINCT extract(year FROM issue_time)::int "
+                f"FROM storms.{LEGACY_TABLE}"
+            )
+        ).scalars()
+        ensure_partitions(conn, ForecastTrack, years)
+        moved = conn.execute(
+            text(
+                f"INSERT INTO storms.{table.name} ({columns}) "
+                f"SELECT {columns} FROM storms.{LEGACY_TABLE}"
+            )
+        ).rowcount
+        forecasts = pd.read_sql_query(
+            text(
+                "SELECT DISTINCT storm_id, issue_time "
+                f"FROM storms.{LEGACY_TABLE}"
+            ),
+            conn,
+        )
+        conn.execute(text(f"DROP TABLE storms.{LEGACY_TABLE}"))
+
+    if len(forecasts):
+        build_forecast_lines(engine, forecasts)
+    logger.info(f"Moved {moved} forecast points.")
+    return moved
+
+
+def run_ecmwf(
+    mode,
+    input_dir,
+    processes=None,
+    batch_size=None,
+    chunksize=10000,
+):
+    """
+    Load a directory of TIGGE cxml forecasts into storms.forecast_tracks.
+
+    Parameters
+    ----------
+    mode [dev or prod]
+    input_dir directory searched recursively for .xml / .cxml files
+    processes number of processes to parse files with (default: all cores)
+    batch_size number of files to parse before writing to the database
+    chunksize number of rows per COPY chunk
+    """
+    coloredlogs.install(
+        logger=logger,
+        fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    logger.info("Starting ECMWF ETL pipeline...")
+    files = find_cxml_files(input_dir)
+    if not files:
+        logger.info(f"No cxml files found in {input_dir}.")
+        return
+    logger.info(f"Found {len(files)} cxml files in {input_dir}.")
+
+    engine = stratus.get_engine(stage=mode, write=True)
+    try:
+        # create_all can't turn a forecast_tracks table from before
+        # partitioning into a partitioned one, so it is moved aside first
+        execute_sql_file(engine, "forecast_tracks_legacy")
+        init_db(engine)
+        # Columns added to Storm and ForecastTrack since their tables were
+        # created
+        execute_sql_file(engine, "storm_aggregates")
+        execute_sql_file(engine, "forecast_tracks_ensemble")
+        execute_sql_file(engine, "forecast_track_lines")
+        move_legacy_forecasts(engine)
+        batches = iter_parsed_batches(
+            files,
+            processes or os.cpu_count(),
+            batch_size or FILES_PER_BATCH,
+        )
+        for tracks in batches:
+            write_forecasts(tracks, engine, chunksize)
+        logger.info("Pipeline successfully finished!")
+
+    except Exception as e:
+        logger.error(f"An error occurred: {e}", exc_info=True)
+        raise
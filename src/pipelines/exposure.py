@@ -0,0 +1,227 @@
+"""
+Exposure index of storms: for each cell of a fixed latitude / longitude
+grid, the storms whose track passed through it, with the track's closest
+approach to the cell's center and its peak wind while in the cell. Lookups
+of the storms near a location read a few cells instead of scanning tracks
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.pipelines.bulk_load import copy_upsert
+
+# Size of grid cells in degrees. Cells are numbered row by row from the
+# south-west corner: cell = row * GRID_COLUMNS + column
+CELL_SIZE = 0.1
+GRID_COLUMNS = round(360 / CELL_SIZE)
+GRID_ROWS = round(180 / CELL_SIZE)
+# Tracks are interpolated between fixes at most this far apart, well under
+# the size of a cell so no cell crossed is missed
+STEP_KM = 5.0
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    """
+    Great-circle distance in km between arrays of points in degrees
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def interpolate_tracks(tracks, step_km=STEP_KM):
+    """
+    Points along `tracks` (sid, valid_time, wind_speed and point geometry),
+    linearly interpolated between consecutive fixes of each storm so they
+    are at most `step_km` apart. Segments crossing the antimeridian take
+    the short way around.
+
+    Returns a DataFrame of sid, lon, lat and wind.
+    """
+    fixes = (
+        pd.DataFrame(
+            {
+                "sid": tracks["sid"].astype(str).to_numpy(),
+                "valid_time": tracks["valid_time"].to_numpy(),
+                "lon": tracks.geometry.x.to_numpy(),
+                "lat": tracks.geometry.y.to_numpy(),
+                "wind": tracks["wind_speed"].to_numpy(
+                    dtype="float64", na_value=np.nan
+                ),
+            }
+        )
+        .drop_duplicates(["sid", "valid_time"])
+        .sort_values(["sid", "valid_time"])
+    )
+    sid = fixes["sid"].to_numpy()
+    lon, lat, wind = (fixes[col].to_numpy() for col in ("lon", "lat", "wind"))
+
+    # Segment i runs from fix i to fix i + 1 of the same storm
+    same_storm = sid[1:] == sid[:-1]
+    dlon = (lon[1:] - lon[:-1] + 180) % 360 - 180
+    dlat = lat[1:] - lat[:-1]
+    dwind = wind[1:] - wind[:-1]
+    length = haversine_km(lon[:-1], lat[:-1], lon[1:], lat[1:])
+    steps = np.where(
+        same_storm, np.maximum(np.ceil(length / step_km), 1), 0
+    ).astype(np.int64)
+
+    # Each fix stands for the points from it up to the next fix; the last
+    # fix of a storm only for itself
+    counts = np.append(np.maximum(steps, 1), 1)
+    deltas = [
+        np.append(np.where(same_storm, delta, 0), 0)
+        for delta in (dlon, dlat, dwind)
+    ]
+    fix = np.repeat(np.arange(len(fixes)), counts)
+    starts = np.cumsum(counts) - counts
+    t = (np.arange(len(fix)) - starts[fix]) / counts[fix]
+    return pd.DataFrame(
+        {
+            "sid": sid[fix],
+            "lon": (lon[fix] + t * deltas[0][fix] + 180) % 360 - 180,
+            "lat": lat[fix] + t * deltas[1][fix],
+            # Without the wind at both ends, only the fixes have one
+            "wind": wind[fix] + np.where(t > 0, t * deltas[2][fix], 0),
+        }
+    )
+
+
+def cell_index(lon, lat):
+    """
+    Grid cells holding points at `lon`, `lat` (arrays, in degrees)
+    """
+    column = np.floor((np.asarray(lon) + 180) / CELL_SIZE).astype(np.int64)
+    row = np.floor((np.asarray(lat) + 90) / CELL_SIZE).astype(np.int64)
+    return np.clip(row, 0, GRID_ROWS - 1) * GRID_COLUMNS + (
+        column % GRID_COLUMNS
+    )
+
+
+def cell_centers(cells):
+    """
+    (lon, lat) of the centers of grid `cells`
+    """
+    row, column = np.divmod(np.asarray(cells), GRID_COLUMNS)
+    return (
+        -180 + (column + 0.5) * CELL_SIZE,
+        -90 + (row + 0.5) * CELL_SIZE,
+    )
+
+
+def exposure_index(tracks, step_km=STEP_KM):
+    """
+    Cells crossed by `tracks`, interpolated every `step_km`: one row per
+    cell and sid with the track's minimum distance in km to the cell's
+    center and its maximum wind while in the cell
+    """
+    points = interpolate_tracks(tracks, step_km)
+    points["cell"] = cell_index(points["lon"], points["lat"])
+    center_lon, center_lat = cell_centers(points["cell"])
+    points["distance"] = haversine_km(
+        points["lon"], points["lat"], center_lon, center_lat
+    )
+    return (
+        points.groupby(["cell", "sid"], sort=False)
+        .agg(
+            min_distance_km=("distance", "min"),
+            max_wind=("wind", "max"),
+        )
+        .reset_index()
+    )
+
+
+def save_exposure(exposure, engine, sids, chunksize=10000):
+    """
+    Replace the cells of storms `sids` in storms.ibtracs_exposure with those
+    in `exposure`. Cells are upserted first and the storms' cells that were
+    not written are deleted after, so readers never miss a storm meanwhile
+    """
+    updated_at = pd.Timestamp.now("UTC").tz_localize(None)
+    counts = copy_upsert(
+        exposure.assign(updated_at=updated_at),
+        engine,
+        table="ibtracs_exposure",
+        conflict_columns=["cell", "sid"],
+        chunksize=chunksize,
+    )
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "DELETE FROM storms.ibtracs_exposure "
+                "WHERE sid = ANY(:sids) AND updated_at < :updated_at"
+            ),
+            {
+                "sids": sorted({str(sid) for sid in sids}),
+                "updated_at": updated_at.to_pydatetime(),
+            },
+        )
+    return counts
+
+
+def cells_near(lon, lat, radius_km):
+    """
+    Grid cells whose center is within `radius_km` of `lon`, `lat`
+    """
+    dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+    rows = np.arange(
+        max(int((lat - dlat + 90) // CELL_SIZE), 0),
+        min(int((lat + dlat + 90) // CELL_SIZE), GRID_ROWS - 1) + 1,
+    )
+    # Near the poles, any longitude can be within the radius
+    cos_lat = np.cos(np.radians(min(abs(lat) + dlat, 90)))
+    if cos_lat * 180 > dlat:
+        dlon = dlat / cos_lat
+        columns = (
+            np.arange(
+                int((lon - dlon + 180) // CELL_SIZE),
+                int((lon + dlon + 180) // CELL_SIZE) + 1,
+            )
+            % GRID_COLUMNS
+        )
+    else:
+        columns = np.arange(GRID_COLUMNS)
+    cells = (rows[:, None] * GRID_COLUMNS + np.unique(columns)).ravel()
+    center_lon, center_lat = cell_centers(cells)
+    return cells[haversine_km(lon, lat, center_lon, center_lat) <= radius_km]
+
+
+def storms_in_cells(engine, cells):
+    """
+    Exposure index rows (cell, sid, min_distance_km, max_wind) of `cells`
+    """
+    with engine.connect() as conn:
+        return pd.read_sql_query(
+            text(
+                "SELECT cell, sid, min_distance_km, max_wind "
+                "FROM storms.ibtracs_exposure WHERE cell = ANY(:cells)"
+            ),
+            conn,
+            params={"cells": [int(cell) for cell in cells]},
+        )
+
+
+def storms_near(engine, lon, lat, radius_km):
+    """
+    Storms whose track passed through a grid cell centered within
+    `radius_km` of `lon`, `lat`, so to within the size of a cell. For each
+    sid, `distance_km` is the distance to the closest of those cells'
+    centers and `max_wind` the maximum wind in them. Sorted by distance
+    """
+    exposure = storms_in_cells(engine, cells_near(lon, lat, radius_km))
+    center_lon, center_lat = cell_centers(exposure["cell"])
+    exposure["distance_km"] = haversine_km(lon, lat, center_lon, center_lat)
+    return (
+        exposure.groupby("sid")
+        .agg(
+            distance_km=("distance_km", "min"),
+            max_wind=("max_wind", "max"),
+        )
+        .sort_values("distance_km")
+        .reset_index()
+    )
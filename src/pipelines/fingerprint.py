@@ -0,0 +1,85 @@
+"""
+Per-storm fingerprints of the IBTrACS NetCDF, to only process storms whose
+data changed since the previous run
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.pipelines.bulk_load import copy_upsert
+
+
+def compute_fingerprints(dataset):
+    """
+    Hash each storm's slice of every variable along the `storm` dimension.
+
+    Variables are read one at a time so a lazily opened Dataset is never
+    fully loaded. Returns a Series of hex digests indexed by sid.
+    """
+    n_storms = dataset.sizes["storm"]
+    hashes = [hashlib.sha256() for _ in range(n_storms)]
+
+    for name in sorted(dataset.variables):
+        variable = dataset[name]
+        if "storm" not in variable.dims:
+            continue
+        values = variable.transpose("storm", ...).values
+        if values.dtype.kind == "O":
+            values = values.astype(str)
+        rows = np.ascontiguousarray(values).reshape(n_storms, -1)
+        for h, row in zip(hashes, rows):
+            h.update(name.encode())
+            h.update(row.tobytes())
+
+    sids = [
+        sid.decode("utf-8") if isinstance(sid, bytes) else str(sid)
+        for sid in dataset["sid"].values
+    ]
+    return pd.Series([h.hexdigest() for h in hashes], index=sids)
+
+
+def changed_storms(fingerprints, engine):
+    """
+    Return a boolean mask of the storms whose fingerprint is new or different
+    from the one stored in `storms.ibtracs_fingerprints`
+    """
+    with engine.connect() as conn:
+        stored = pd.read_sql(
+            text(
+                "SELECT sid, fingerprint FROM storms.ibtracs_fingerprints "
+                "WHERE sid = ANY(:sids)"
+            ),
+            conn,
+            params={"sids": list(fingerprints.index)},
+        )
+    previous = stored.set_index("sid")["fingerprint"].reindex(
+        fingerprints.index
+    )
+    return (previous != fingerprints).to_numpy()
+
+
+def select_changed_storms(dataset, fingerprints, engine):
+    """
+    Subset `dataset` and `fingerprints` to the storms that changed
+    """
+    changed = changed_storms(fingerprints, engine)
+    return dataset.isel(storm=np.flatnonzero(changed)), fingerprints[changed]
+
+
+def save_fingerprints(fingerprints, engine):
+    """
+    Record the fingerprints of storms that were successfully written
+    """
+    df = pd.DataFrame(
+        {
+            "sid": fingerprints.index,
+            "fingerprint": fingerprints.to_numpy(),
+            "updated_at": pd.Timestamp.now("UTC").tz_localize(None),
+        }
+    )
+    return copy_upsert(
+        df, engine, table="ibtracs_fingerprints", conflict_columns=["sid"]
+    )
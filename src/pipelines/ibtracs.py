@@ -5,107 +5,843 @@ IBTrACS ETL pipeline
 
 import os
 import logging
+import time
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 import coloredlogs
 import ocha_lens as lens
 from dotenv import load_dotenv
+import numpy as np
+import pandas as pd
 import xarray as xr
+from sqlalchemy import create_engine, text
 
 load_dotenv()
 
 import ocha_stratus as stratus  # noqa
+from src.pipelines.aggregates import add_storm_aggregates  # noqa
+from src.pipelines.blob_upload import upload_file_in_blocks  # noqa
+from src.pipelines.bulk_load import (  # noqa
+    HASH_COLUMN,
+    add_row_hash,
+    copy_upsert,
+)
+from src.pipelines.checkpoint import Checkpoint, unit_key  # noqa
+from src.pipelines.cache import (  # noqa
+    cache_key,
+    file_sha256,
+    load_extracted,
+    save_extracted,
+)
+from src.pipelines.download import (  # noqa
+    IBTRACS_BASE_URL,
+    commit_manifest,
+    conditional_download,
+)
+from src.pipelines.exposure import exposure_index, save_exposure  # noqa
+from src.pipelines.metrics import span, start_run  # noqa
+from src.pipelines.fingerprint import (  # noqa
+    changed_storms,
+    compute_fingerprints,
+    save_fingerprints,
+    select_changed_storms,
+)
+from src.pipelines.tiles import (  # noqa
+    changed_extents,
+    invalidate_tiles,
+    storm_extents,
+)
+from src.pipelines.track_lines import build_track_lines  # noqa
+from src.schemas.database import execute_sql_file  # noqa
 
 
 logger = logging.getLogger(__name__)
 
+DATASET_TYPES = ["last3years", "ACTIVE", "ALL"]
+# Storms count as active if they had a fix this close to the latest fix in
+# the file
+ACTIVE_WINDOW = pd.Timedelta(days=7)
+# String columns with at most this share of distinct values become categories
+CATEGORY_MAX_UNIQUE = 0.5
+# Largest change a float measurement may take from being stored as float32
+FLOAT32_TOLERANCE = 1e-3
+# Files in src/schemas/sql adding the columns of later versions to existing
+# tables, run at the start of each run
+MIGRATIONS = ["ibtracs_row_hash", "ibtracs_storm_aggregates"]
+# Materialized views in storms, defined in sql/ibtracs_summaries.sql
+SUMMARY_VIEWS = [
+    "ibtracs_season_basin_summary",
+    "ibtracs_basin_track_summary",
+    "ibtracs_storm_track_summary",
+]
 
-def retrieve_ibtracs(
-    dataset_type, stage="local", save_to_blob=False, save_dir=None
+
+def download_ibtracs_file(
+    dataset_type, save_dir, conditional=False, base_url=IBTRACS_BASE_URL
 ):
     """
-    Download IBTrACS Netcdf, upload raw to azure if needed and return loaded Dataset
+    Download the IBTrACS Netcdf, or reuse a previous download, and return its
+    path.
+
+    With `conditional` the file is requested from `base_url` with the
+    validators recorded in its manifest, and None is returned if the source
+    hasn't changed since the last download.
     """
     logger.info(f"Retrieving {dataset_type} from IBTrACS...")
     filename = f"IBTrACS.{dataset_type}.v04r01.nc"
     file_path = f"{save_dir}/" + filename
 
-    if os.path.exists(file_path):
-        logger.info(f"Using file downloaded in {file_path}...")
-        path = file_path
-    else:
-        path = lens.ibtracs.download_ibtracs(
-            dataset=dataset_type, save_dir=save_dir
+    with span("download", dataset_type=dataset_type) as s:
+        s.bytes_written = 0
+        if conditional:
+            changed = conditional_download(f"{base_url}/{filename}", file_path)
+            if not changed:
+                logger.info(
+                    f"{filename} is unchanged since the last download."
+                )
+                return None
+            logger.info(
+                f"Successfully downloaded {dataset_type} to {file_path}."
+            )
+            path = file_path
+            s.bytes_written = os.path.getsize(path)
+        elif os.path.exists(file_path):
+            logger.info(f"Using file downloaded in {file_path}...")
+            path = file_path
+        else:
+            path = lens.ibtracs.download_ibtracs(
+                dataset=dataset_type, save_dir=save_dir
+            )
+            logger.info(f"Successfully downloaded {dataset_type} to {path}.")
+            s.bytes_written = os.path.getsize(path)
+    return path
+
+
+def upload_raw_to_blob(path, stage, container_client=None):
+    """
+    Stream the raw Netcdf to Azure blob in fixed-size blocks
+    """
+    logger.info(f"Uploading {path} to Azure blob in {stage}...")
+    if container_client is None:
+        container_client = stratus.get_container_client(
+            container_name="storm", stage=stage, write=True
         )
-        logger.info(f"Successfully downloaded {dataset_type} to {path}.")
+    with span("blob_upload") as s:
+        uploaded = upload_file_in_blocks(
+            path,
+            blob_name=f"ibtracs/v04r01/{os.path.basename(path)}",
+            container_client=container_client,
+        )
+        s.bytes_read = os.path.getsize(path)
+    logger.info(f"Successfully uploaded to blob ({uploaded} new blocks).")
+
+
+def open_ibtracs(path, lazy=False):
+    """
+    Open the IBTrACS Netcdf. With `lazy` the Dataset is only opened, so
+    variables are read from disk when they are accessed (see
+    `iter_storm_batches`), otherwise it is loaded into memory.
+    """
+    with span("open", lazy=lazy) as s:
+        dataset = xr.open_dataset(path)
+        if not lazy:
+            dataset = dataset.load()
+            s.bytes_read = dataset.nbytes
+        s.rows_out = dataset.sizes["storm"]
+    return dataset
+
+
+def retrieve_ibtracs(
+    dataset_type,
+    stage="local",
+    save_to_blob=False,
+    save_dir=None,
+    lazy=False,
+    conditional=False,
+    base_url=IBTRACS_BASE_URL,
+):
+    """
+    Download IBTrACS Netcdf, upload raw to azure if needed and return loaded Dataset
+
+    Returns None if `conditional` is set and the source is unchanged.
+    """
+    path = download_ibtracs_file(
+        dataset_type, save_dir, conditional=conditional, base_url=base_url
+    )
+    if path is None:
+        return None
 
     if save_to_blob:
-        logger.info(f"Uploading {path} to Azure blob in {stage}...")
-        with open(path, "rb") as file:
-            data_to_upload = file.read()
-        stratus.upload_blob_data(
-            container_name="storm",
-            data=data_to_upload,
-            blob_name=f"ibtracs/v04r01/{filename}",
-            stage=stage,
+        upload_raw_to_blob(path, stage)
+
+    return open_ibtracs(path, lazy=lazy)
+
+
+def iter_storm_batches(dataset, batch_size, skip=None):
+    """
+    Yield consecutive slices of `batch_size` storms, loaded into memory one
+    at a time. Batches for whose sids `skip` returns True are not loaded
+    """
+    n_storms = dataset.sizes["storm"]
+    sids = dataset["sid"].values if skip else None
+    for start in range(0, n_storms, batch_size):
+        stop = min(start + batch_size, n_storms)
+        if skip and skip(sids[start:stop]):
+            logger.info(f"Skipping storms {start} to {stop}, already loaded.")
+            continue
+        logger.info(f"Loading storms {start} to {stop} of {n_storms}...")
+        with span("load_batch") as s:
+            batch = dataset.isel(storm=slice(start, stop)).load()
+            s.rows_out = stop - start
+            s.bytes_read = batch.nbytes
+        yield batch
+
+
+def select_dataset_type(dataset, dataset_type):
+    """
+    Return the indices of the storms of an `ALL` Dataset that are in the
+    `dataset_type` subset: the last three seasons for `last3years`, and
+    provisional tracks with recent fixes for `ACTIVE`
+    """
+    n_storms = dataset.sizes["storm"]
+    if dataset_type == "ALL":
+        return np.arange(n_storms)
+    elif dataset_type == "last3years":
+        seasons = dataset["season"].values
+        return np.flatnonzero(seasons >= seasons.max() - 2)
+    elif dataset_type == "ACTIVE":
+        provisional = np.char.startswith(
+            dataset["track_type"].values.astype("S"), b"PROVISIONAL"
         )
-        logger.info("Successfully uploaded to blob.")
+        # Datetimes aren't skipped as missing by default
+        last_fix = dataset["time"].max(dim="date_time", skipna=True).values
+        recent = last_fix >= np.nanmax(last_fix) - ACTIVE_WINDOW.to_numpy()
+        return np.flatnonzero(provisional & recent)
+    else:
+        raise ValueError(f"Unknown dataset type: {dataset_type}")
+
 
-    return xr.open_dataset(path).load()
+def select_dataset_types(dataset, dataset_types):
+    """
+    Return the indices of the storms in any of `dataset_types`, each storm
+    once, in the order the subsets are given
+    """
+    selected = []
+    seen = np.zeros(dataset.sizes["storm"], bool)
+    for dataset_type in dataset_types:
+        with span("select_dataset_type", dataset_type=dataset_type) as s:
+            indices = select_dataset_type(dataset, dataset_type)
+            new = indices[~seen[indices]]
+            seen[new] = True
+            s.rows_in, s.rows_out = len(indices), len(new)
+        logger.info(
+            f"{dataset_type}: {len(indices)} storms, {len(new)} not already "
+            "selected for this run."
+        )
+        selected.append(new)
+    return np.concatenate(selected)
 
 
-def process_tracks(dataset, engine, chunksize):
+def plan_shards(dataset, storm_indices, shard_by="season", shard_size=None):
     """
-    Retrieve 'best' and 'provisional' tracks and upload them to the database
+    Split storm indices into shards of whole seasons, or of consecutive
+    ranges of `shard_size` storms
     """
-    logger.info("Extracting tracks...")
-    tracks_geo = lens.ibtracs.get_tracks(dataset)
+    if shard_by == "season":
+        seasons = dataset["season"].values[storm_indices]
+        return [storm_indices[seasons == s] for s in np.unique(seasons)]
+    elif shard_by == "range":
+        if not shard_size:
+            raise ValueError("Sharding by range requires a shard size")
+        return [
+            storm_indices[i : i + shard_size]
+            for i in range(0, len(storm_indices), shard_size)
+        ]
+    else:
+        raise ValueError(f"Unknown shard type: {shard_by}")
 
-    # In order to comply with the type of object we can apply this function to each geometry
-    # and then run the upsert or use to_postgis to a temporary table instead of to_sql and
-    # then run another query to do the upsert
-    logger.info("Transforming geometry...")
-    tracks_geo["geometry"] = tracks_geo["geometry"].to_wkt()
 
-    logger.info("Updating tracks in database...")
-    with engine.connect() as conn:
-        tracks_geo.to_sql(
-            name="ibtracs_tracks_geo",
-            con=conn,
-            schema="storms",
-            if_exists="append",
-            index=False,
-            method=stratus.postgres_upsert,
+def extract_shard(
+    path, storm_indices, cache_dir=None, file_hash=None, cache_bytes=None
+):
+    """
+    Extract storms and tracks for a subset of storms. Run in worker
+    processes, so the NetCDF is opened here rather than passed in.
+
+    With a `cache_dir`, the frames are read from or saved to the extraction
+    cache (see `src.pipelines.cache`)
+    """
+    with xr.open_dataset(path) as dataset:
+        if cache_dir:
+            key = cache_key(file_hash, dataset["sid"].values[storm_indices])
+            cached = load_extracted(cache_dir, key)
+            if cached is not None:
+                return cached
+        shard = dataset.isel(storm=storm_indices).load()
+    tracks = extract_tracks(shard)
+    storms = extract_storms(shard, tracks)
+    if cache_dir:
+        save_extracted(cache_dir, key, storms, tracks, cache_bytes)
+    return storms, tracks
+
+
+def iter_extracted_shards(path, shards, processes, **extract_kwargs):
+    """
+    Extract shards in a process pool and yield (storms, tracks) as they
+    complete. At most two shards per process are in flight, so finished
+    results don't pile up in memory while the database catches up
+    """
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=context
+    ) as pool:
+        pending = set()
+        for i, shard in enumerate(shards):
+            pending.add(
+                pool.submit(extract_shard, path, shard, **extract_kwargs)
+            )
+            if len(pending) >= 2 * processes:
+                # Only the time spent waiting on the workers is measured
+                with span("extract_shards", processes=processes) as s:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    s.rows_out = sum(len(f.result()[1]) for f in done)
+                for future in done:
+                    yield future.result()
+            logger.info(f"Submitted shard {i + 1} of {len(shards)}...")
+        with span("extract_shards", processes=processes) as s:
+            done = wait(pending).done
+            s.rows_out = sum(len(f.result()[1]) for f in done)
+        for future in done:
+            yield future.result()
+
+
+def _transform_geometry(df, load_method):
+    """
+    Convert the geometry column to what the load method sends to PostGIS.
+    Returns the frame and the extra arguments for `copy_upsert`
+    """
+    if "geometry" not in df.columns:
+        return df, {}
+    if load_method == "copy":
+        # Ship plain coordinates and build the points during the merge,
+        # rather than serializing every point to WKT for PostGIS to parse
+        df = pd.DataFrame(df.drop(columns="geometry")).assign(
+            longitude=df.geometry.x.to_numpy(),
+            latitude=df.geometry.y.to_numpy(),
+        )
+        return df, {
+            "staging_types": {
+                "longitude": "DOUBLE PRECISION",
+                "latitude": "DOUBLE PRECISION",
+            },
+            "expressions": {
+                "geometry": "ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)"
+            },
+        }
+    return df.assign(geometry=df["geometry"].to_wkt()), {}
+
+
+def _write_chunk(
+    df,
+    engine,
+    table,
+    conflict_columns,
+    chunksize,
+    load_method,
+    copy_kwargs=None,
+):
+    """
+    Upsert a DataFrame into a storms table in a single transaction.
+
+    Returns the number of rows written and their MergeCounts, which only the
+    copy method reports
+    """
+    if load_method == "copy":
+        counts = copy_upsert(
+            df,
+            engine,
+            table=table,
+            conflict_columns=conflict_columns,
             chunksize=chunksize,
+            **(copy_kwargs or {}),
         )
+        return counts.rows, counts
+    elif load_method == "upsert":
+        with engine.connect() as conn:
+            df.to_sql(
+                name=table,
+                con=conn,
+                schema="storms",
+                if_exists="append",
+                index=False,
+                method=stratus.postgres_upsert,
+                chunksize=chunksize,
+            )
+        return len(df), None
+    else:
+        raise ValueError(f"Unknown load method: {load_method}")
+
+
+def write_table(
+    df,
+    engine,
+    table,
+    conflict_columns,
+    chunksize,
+    load_method,
+    workers=1,
+    checkpoint=None,
+    unit=None,
+    changed_column=None,
+):
+    """
+    Upsert a DataFrame into a storms table with the selected load method.
+
+    With more than one worker the frame is split into chunks of `chunksize`
+    rows that are written concurrently, each in its own transaction on its
+    own pooled connection. Duplicate keys are dropped beforehand so no two
+    chunks touch the same row.
+
+    With a `checkpoint`, chunks are also committed one at a time and
+    recorded under `unit`, and chunks already committed are skipped.
+
+    Returns the distinct values of `changed_column` in rows that were
+    inserted or updated, or None if that isn't known: without
+    `changed_column`, with the upsert method, or when chunks committed by a
+    previous run were skipped.
+    """
+    if len(df) == 0:
+        return frozenset() if changed_column else None
+
+    start = time.perf_counter()
+    with span("transform_geometry", table=table) as s:
+        s.rows_in = len(df)
+        df, copy_kwargs = _transform_geometry(df, load_method)
+    if changed_column is not None and load_method == "copy":
+        copy_kwargs["changed_column"] = changed_column
+    resumed = False
+
+    with span("write", table=table, load_method=load_method) as s:
+        s.rows_in = len(df)
+        # In-memory size of the frame sent to the database
+        s.bytes_written = int(df.memory_usage(index=False).sum())
+        if checkpoint is not None or (workers > 1 and len(df) > chunksize):
+            df = df.drop_duplicates(subset=conflict_columns, keep="last")
+            chunks = [
+                (i // chunksize, df.iloc[i : i + chunksize])
+                for i in range(0, len(df), chunksize)
+            ]
+            if checkpoint is not None:
+                committed = checkpoint.committed_chunks(table, unit)
+                chunks = [(i, c) for i, c in chunks if i not in committed]
+                resumed = bool(committed)
+                if committed:
+                    logger.info(
+                        f"Skipping {len(committed)} chunks of storms.{table} "
+                        "committed by a previous run."
+                    )
+
+            def write_chunk(item):
+                i, chunk = item
+                written = _write_chunk(
+                    chunk,
+                    engine,
+                    table,
+                    conflict_columns,
+                    chunksize,
+                    load_method,
+                    copy_kwargs,
+                )
+                if checkpoint is not None:
+                    checkpoint.commit_chunk(table, unit, i)
+                return written
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(write_chunk, chunks))
+        else:
+            results = [
+                _write_chunk(
+                    df,
+                    engine,
+                    table,
+                    conflict_columns,
+                    chunksize,
+                    load_method,
+                    copy_kwargs,
+                )
+            ]
+        rows = sum(written for written, _ in results)
+        s.rows_out = rows
+        counts = [counts for _, counts in results if counts is not None]
+        if counts:
+            s.rows_inserted = sum(c.inserted for c in counts)
+            s.rows_updated = sum(c.updated for c in counts)
+            s.rows_unchanged = sum(c.unchanged for c in counts)
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Wrote {rows} rows to storms.{table} with {load_method} in "
+        f"{elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)."
+    )
+    if changed_column is None or resumed or len(counts) < len(results):
+        return None
+    return frozenset().union(*(c.changed for c in counts))
+
+
+def compact_dtypes(df):
+    """
+    Convert the columns of an extracted frame to compact dtypes, in place:
+
+    - repeated strings (basin, nature, provider, sid in tracks...) become
+      categories
+    - integers take the smallest integer type that holds them, and floats
+      float32 where that changes them by at most FLOAT32_TOLERANCE
+    - timestamps become datetime64[s] where they have no fractional seconds
+
+    List-valued, geometry and unique string columns are left as they are,
+    and so are row hashes, which have to be computed before this.
+    """
+    with span("compact_dtypes") as s:
+        s.rows_in = s.rows_out = len(df)
+        s.bytes_read = int(df.memory_usage(index=False, deep=True).sum())
+        for col in df.columns:
+            series = df[col]
+            if col == HASH_COLUMN or series.dtype.name == "geometry":
+                continue
+            # Not is_string_dtype, which holds for any empty object column,
+            # e.g. every column of a batch without tracks
+            if pd.api.types.infer_dtype(series, skipna=True) == "string":
+                if series.nunique() <= CATEGORY_MAX_UNIQUE * len(series):
+                    df[col] = series.astype("category")
+            elif pd.api.types.is_integer_dtype(series):
+                df[col] = pd.to_numeric(series, downcast="integer")
+            elif pd.api.types.is_float_dtype(series):
+                compact = series.astype("float32")
+                error = (compact.astype("float64") - series).abs().max()
+                if not error > FLOAT32_TOLERANCE:
+                    df[col] = compact
+            elif pd.api.types.is_datetime64_dtype(series):
+                if series.dt.floor("s").equals(series):
+                    df[col] = series.dt.as_unit("s")
+        s.bytes_written = int(df.memory_usage(index=False, deep=True).sum())
+    logger.info(
+        f"Compacted {len(df)} rows from {s.bytes_read / 1024**2:,.1f} MB to "
+        f"{s.bytes_written / 1024**2:,.1f} MB."
+    )
+    return df
+
+
+def extract_tracks(dataset):
+    """
+    Retrieve 'best' and 'provisional' tracks, with the hash of each row,
+    in compact dtypes
+    """
+    logger.info("Extracting tracks...")
+    with span("extract_tracks") as s:
+        s.rows_in = dataset.sizes["storm"]
+        # Extracted separately since a subset of storms may have no tracks of
+        # one type, which ocha-lens returns as a plain empty DataFrame
+        tracks = [
+            lens.ibtracs.get_tracks(dataset, track_type=track_type)
+            for track_type in ["provisional", "best"]
+        ]
+        tracks = [df for df in tracks if len(df)] or tracks[:1]
+        # ocha-lens makes up a new random point_id on every extraction
+        tracks = add_row_hash(pd.concat(tracks), exclude=["point_id"])
+        s.rows_out = len(tracks)
+    return compact_dtypes(tracks)
+
+
+def write_tracks(
+    tracks_geo,
+    engine,
+    chunksize,
+    load_method="copy",
+    workers=1,
+    checkpoint=None,
+    unit=None,
+):
+    """
+    Upload tracks to the database. Returns the sids of storms whose track
+    points changed, or None if that isn't known (see write_table)
+    """
+    logger.info("Updating tracks in database...")
+    changed = write_table(
+        tracks_geo,
+        engine,
+        table="ibtracs_tracks_geo",
+        conflict_columns=["sid", "storm_id", "valid_time"],
+        chunksize=chunksize,
+        load_method=load_method,
+        workers=workers,
+        checkpoint=checkpoint,
+        unit=unit,
+        changed_column="sid",
+    )
     logger.info("Successfully processed tracks.")
+    return changed
+
+
+def write_exposure(tracks_geo, engine, chunksize):
+    """
+    Rebuild the exposure index of the storms in `tracks_geo` from their
+    tracks, interpolated between fixes
+    """
+    if tracks_geo.empty:
+        return
+    with span("exposure_index") as s:
+        s.rows_in = len(tracks_geo)
+        exposure = exposure_index(tracks_geo)
+        s.rows_out = len(exposure)
+    with span("write", table="ibtracs_exposure") as s:
+        s.rows_in = len(exposure)
+        counts = save_exposure(
+            exposure, engine, tracks_geo["sid"].unique(), chunksize
+        )
+        s.rows_out = counts.rows
+    logger.info(f"Indexed {len(exposure)} exposed cells.")
+
 
+def process_tracks(dataset, engine, chunksize, load_method="copy", workers=1):
+    """
+    Retrieve 'best' and 'provisional' tracks and upload them to the database
+    """
+    tracks_geo = extract_tracks(dataset)
+    write_tracks(tracks_geo, engine, chunksize, load_method, workers)
     return tracks_geo
 
 
-def process_storms(dataset, engine, chunksize):
+def write_storms(
+    storms,
+    engine,
+    chunksize,
+    load_method="copy",
+    workers=1,
+    checkpoint=None,
+    unit=None,
+):
+    """
+    Upload storms to the database. Returns the sids of storms that changed,
+    or None if that isn't known (see write_table)
+    """
+    changed = write_table(
+        storms,
+        engine,
+        table="ibtracs_storms",
+        conflict_columns=["sid"],
+        chunksize=chunksize,
+        load_method=load_method,
+        workers=workers,
+        checkpoint=checkpoint,
+        unit=unit,
+        changed_column="sid",
+    )
+    logger.info("Successfully processed storms.")
+    return changed
+
+
+def extract_storms(dataset, tracks):
+    """
+    Retrieve storms, with the aggregates of their `tracks` (peak wind,
+    minimum pressure, first and last valid time, duration and basins) and
+    the hash of each row
+    """
+    with span("extract_storms") as s:
+        s.rows_in = dataset.sizes["storm"]
+        storms = lens.ibtracs.get_storms(dataset)
+        storms = add_row_hash(add_storm_aggregates(storms, tracks))
+        s.rows_out = len(storms)
+    return compact_dtypes(storms)
+
+
+def process_storms(
+    dataset,
+    engine,
+    chunksize,
+    load_method="copy",
+    workers=1,
+    checkpoint=None,
+    unit=None,
+    tracks=None,
+):
     """
-    Retrieve 'storm' tracks and upload them to the database
+    Retrieve 'storm' tracks and upload them to the database. Their
+    aggregates are computed from `tracks`, which are extracted here if not
+    given
     """
     logger.info("Processing storms...")
 
-    storm_tracks = lens.ibtracs.get_storms(dataset)
+    if tracks is None:
+        tracks = extract_tracks(dataset)
+    storm_tracks = extract_storms(dataset, tracks)
+    write_storms(
+        storm_tracks,
+        engine,
+        chunksize,
+        load_method,
+        workers,
+        checkpoint,
+        unit,
+    )
+    return storm_tracks
+
+
+def refresh_summaries(engine):
+    """
+    Create the summary views of storms and tracks if they don't exist, and
+    refresh them concurrently so readers aren't blocked meanwhile
+    """
+    logger.info("Refreshing summary views...")
+    with span("refresh_summaries"):
+        execute_sql_file(engine, "ibtracs_summaries")
+        for view in SUMMARY_VIEWS:
+            with engine.connect() as conn:
+                with conn.begin():
+                    conn.exec_driver_sql(
+                        f"REFRESH MATERIALIZED VIEW CONCURRENTLY storms.{view}"
+                    )
+
 
+def extract_batch(batch, cache_dir=None, file_hash=None, cache_bytes=None):
+    """
+    Extract the storms and tracks of a batch, or take them from the cache
+    of extracted frames in `cache_dir` if set
+    """
+    if cache_dir:
+        key = cache_key(file_hash, batch["sid"].values)
+        cached = load_extracted(cache_dir, key)
+        if cached is not None:
+            logger.info("Using cached storms and tracks...")
+            return cached
+
+    # Storms are aggregated from their tracks, so these are extracted first
+    tracks_geo = extract_tracks(batch)
+    storms = extract_storms(batch, tracks_geo)
+    if cache_dir:
+        save_extracted(cache_dir, key, storms, tracks_geo, cache_bytes)
+    return storms, tracks_geo
+
+
+def stale_sids(engine, table, sids, changed):
+    """
+    Storms among `sids` whose rows in `table`, derived from their tracks,
+    have to be rebuilt: those whose tracks `changed` (all of them if that
+    isn't known), and those without rows in `table` yet
+    """
+    sids = {str(sid) for sid in sids}
+    if changed is None:
+        return sids
     with engine.connect() as conn:
-        storm_tracks.to_sql(
-            "ibtracs_storms",
-            con=conn,
-            schema="storms",
-            if_exists="append",
-            index=False,
-            method=stratus.postgres_upsert,
-            chunksize=chunksize,
-        )
+        present = conn.execute(
+            text(
+                f"SELECT DISTINCT sid FROM storms.{table} "
+                "WHERE sid = ANY(:sids)"
+            ),
+            {"sids": sorted(sids)},
+        ).scalars()
+        return (sids & changed) | (sids - set(present))
 
-    logger.info("Successfully processed storms.")
-    return storm_tracks
+
+def load_unit(
+    storms,
+    tracks_geo,
+    engine,
+    chunksize,
+    load_method="copy",
+    workers=1,
+    checkpoint=None,
+    unit=None,
+    fingerprints=None,
+    tile_cache=None,
+):
+    """
+    Load a unit of work, a batch or shard of extracted storms and their
+    tracks: write the storms, then the tracks that reference them, rebuild
+    the track lines and exposure index of the storms whose tracks changed,
+    invalidate their cached tiles, record their `fingerprints` if given,
+    and mark `unit` as complete in `checkpoint`
+    """
+    if tile_cache:
+        extents = storm_extents(engine, storms["sid"])
+    write_storms(
+        storms,
+        engine,
+        chunksize,
+        load_method,
+        workers,
+        checkpoint,
+        unit,
+    )
+    changed_tracks = write_tracks(
+        tracks_geo,
+        engine,
+        chunksize,
+        load_method,
+        workers,
+        checkpoint,
+        unit,
+    )
+    build_track_lines(
+        engine,
+        stale_sids(
+            engine, "ibtracs_track_lines", storms["sid"], changed_tracks
+        ),
+    )
+    stale = stale_sids(
+        engine, "ibtracs_exposure", storms["sid"], changed_tracks
+    )
+    write_exposure(
+        tracks_geo[tracks_geo["sid"].astype(str).isin(stale)],
+        engine,
+        chunksize,
+    )
+    if tile_cache:
+        invalidate_changed_tiles(engine, tile_cache, storms["sid"], extents)
+    if fingerprints is not None:
+        save_fingerprints(fingerprints, engine)
+    if checkpoint is not None:
+        checkpoint.complete_unit(unit)
+
+
+def invalidate_changed_tiles(engine, tile_cache, sids, before):
+    """
+    Delete the tiles in `tile_cache` showing storms `sids` where their
+    content changed since their extents `before` were taken
+    """
+    with span("invalidate_tiles") as s:
+        after = storm_extents(engine, sids)
+        s.rows_in = len(after)
+        s.rows_out = invalidate_tiles(
+            tile_cache, changed_extents(before, after)
+        )
+    logger.info(f"Invalidated {s.rows_out} cached tiles.")
 
 
 def run_ibtracs(
-    mode, dataset_type, save_to_blob=False, save_dir="/tmp", chunksize=10000
+    mode,
+    dataset_type,
+    *,
+    save_to_blob=False,
+    save_dir="/tmp",
+    chunksize=10000,
+    load_method="copy",
+    batch_size=None,
+    incremental=False,
+    conditional=False,
+    workers=1,
+    processes=1,
+    shard_by="season",
+    cache_size=0,
+    metrics_report=None,
+    prometheus_textfile=None,
+    trace_memory=False,
+    resume=False,
+    tile_cache=None,
 ):
     """
     Main function to orchestrate the execution of pipeline functions.
@@ -114,6 +850,37 @@ def run_ibtracs(
     ----------
     save_to_blob flag to determine whether the netcdf file should be saved
     mode [dev or prod]
+    dataset_type [last3years, ACTIVE or ALL], or a list of them. For a list,
+        the ALL file is downloaded and opened once and the other subsets are
+        selected from it, each storm being loaded once
+    load_method [copy or upsert] how rows are written to the database
+    batch_size number of storms to extract and write at a time. If set, the
+        NetCDF is opened lazily and only one batch is held in memory
+    incremental flag to only process storms whose data changed since the
+        last run, based on the fingerprints in storms.ibtracs_fingerprints
+    conditional flag to skip the run entirely if the IBTrACS file hasn't
+        changed upstream since it was last downloaded
+    workers number of concurrent database writers. Chunks of each table are
+        written in parallel
+    processes number of processes to extract storms and tracks with. Above
+        one, the storms are split into shards that are extracted in a process
+        pool and written as they complete
+    shard_by [season or range] how to split storms into shards. Ranges are
+        `batch_size` storms long
+    cache_size size in GB of the cache of extracted frames kept in
+        `save_dir`, keyed by the file's content, the ocha-lens version and
+        the storms extracted. Reruns on the same file skip extraction. 0
+        disables the cache
+    metrics_report path to write a JSON report of the run to, with the
+        duration, rows, bytes and peak memory of each stage
+    prometheus_textfile path to write the same metrics to in the Prometheus
+        text format, e.g. for the node_exporter textfile collector
+    trace_memory flag to record the peak Python memory of each stage with
+        tracemalloc, which slows the run down
+    resume flag to pick up a failed run where it stopped. Progress (the
+        download, blob upload, and committed chunks of each batch or shard)
+        is checkpointed in `save_dir` by every run and removed once it
+        succeeds
     """
 
     coloredlogs.install(
@@ -122,27 +889,207 @@ def run_ibtracs(
     )
 
     logger.info("Starting IBTrACS ETL pipeline...")
+    if isinstance(dataset_type, str):
+        dataset_type = [dataset_type]
+    dataset_types = list(dataset_type)
+    # Subsets are derived locally from the ALL file when there are several
+    dataset_type = dataset_types[0] if len(dataset_types) == 1 else "ALL"
+    run = start_run(
+        "ibtracs",
+        trace_memory=trace_memory,
+        mode=mode,
+        dataset_types=dataset_types,
+        load_method=load_method,
+        batch_size=batch_size,
+        incremental=incremental,
+        workers=workers,
+        processes=processes,
+    )
+    error = None
 
     # Setting up engine
     engine = stratus.get_engine(stage=mode, write=True)
+    if workers > 1:
+        # One pooled connection per writer, plus one for the main thread
+        engine = create_engine(
+            engine.url, pool_size=workers + 1, max_overflow=0
+        )
+    uploader = ThreadPoolExecutor(max_workers=1)
+
+    checkpoint = Checkpoint(
+        os.path.join(
+            save_dir, f"ibtracs_{'+'.join(dataset_types)}.checkpoint.json"
+        ),
+        chunksize=chunksize,
+        resume=resume,
+    )
 
     try:
-        # Retrieve data from source and upload to blob if true
-        dataset = retrieve_ibtracs(
-            dataset_type=dataset_type,
-            stage=mode,
-            save_to_blob=save_to_blob,
-            save_dir=save_dir,
+        # Retrieve data from source, unless a resumed run already has it
+        path = checkpoint.downloaded_file()
+        if path is not None:
+            logger.info(f"Resuming the previous run on {path}...")
+        else:
+            path = download_ibtracs_file(
+                dataset_type, save_dir=save_dir, conditional=conditional
+            )
+            if path is None:
+                logger.info("Source unchanged, nothing to process.")
+                checkpoint.clear()
+                return
+            checkpoint.complete_download(path)
+
+        # Bring tables created by earlier versions up to date, once there is
+        # something to load into them
+        for migration in MIGRATIONS:
+            execute_sql_file(engine, migration)
+
+        # Upload the raw file to blob in the background if true
+        upload_needed = save_to_blob and not checkpoint.stage("blob_upload")
+        if upload_needed:
+            upload = uploader.submit(upload_raw_to_blob, path, mode)
+
+        dataset = open_ibtracs(
+            path, lazy=batch_size is not None or processes > 1
         )
 
-        # Process storms and add them to the database
-        process_storms(dataset=dataset, engine=engine, chunksize=chunksize)
+        storm_indices = np.arange(dataset.sizes["storm"])
+        if len(dataset_types) > 1:
+            storm_indices = select_dataset_types(dataset, dataset_types)
+
+        execute_sql_file(engine, "ibtracs_track_lines")
+        execute_sql_file(engine, "ibtracs_exposure")
+        if incremental:
+            execute_sql_file(engine, "ibtracs_fingerprints")
+
+        cache = {}
+        if cache_size:
+            cache = {
+                "cache_dir": os.path.join(save_dir, "ibtracs_cache"),
+                "file_hash": file_sha256(path),
+                "cache_bytes": int(cache_size * 1024**3),
+            }
+
+        if processes > 1:
+            # Shards are extracted from the file, so they keep indices into it
+            if incremental:
+                with span("fingerprints") as s:
+                    fingerprints = compute_fingerprints(
+                        dataset.isel(storm=storm_indices)
+                    )
+                    changed = changed_storms(fingerprints, engine)
+                    storm_indices = storm_indices[changed]
+                    fingerprints = fingerprints[changed]
+                    s.rows_in, s.rows_out = len(changed), len(fingerprints)
+                logger.info(
+                    f"Found {len(fingerprints)} new or changed storms."
+                )
+
+            shards = plan_shards(dataset, storm_indices, shard_by, batch_size)
+            sids = dataset["sid"].values
+            shards = [
+                shard
+                for shard in shards
+                if not checkpoint.unit_done(unit_key(sids[shard]))
+            ]
+            extracted = iter_extracted_shards(path, shards, processes, **cache)
+            for storms, tracks_geo in extracted:
+                shard_fingerprints = None
+                if incremental:
+                    shard_fingerprints = fingerprints[
+                        fingerprints.index.isin(storms["sid"])
+                    ]
+                load_unit(
+                    storms,
+                    tracks_geo,
+                    engine,
+                    chunksize,
+                    load_method,
+                    workers,
+                    checkpoint,
+                    unit_key(storms["sid"]),
+                    fingerprints=shard_fingerprints,
+                    tile_cache=tile_cache,
+                )
+        else:
+            if len(storm_indices) < dataset.sizes["storm"]:
+                dataset = dataset.isel(storm=storm_indices)
+            if batch_size:
+                batches = iter_storm_batches(
+                    dataset,
+                    batch_size,
+                    skip=lambda sids: checkpoint.unit_done(unit_key(sids)),
+                )
+            else:
+                batches = [dataset]
+
+            for batch in batches:
+                unit = unit_key(batch["sid"].values)
+                if checkpoint.unit_done(unit):
+                    logger.info("Storms already loaded, skipping.")
+                    continue
+
+                if incremental:
+                    with span("fingerprints") as s:
+                        s.rows_in = batch.sizes["storm"]
+                        fingerprints = compute_fingerprints(batch)
+                        batch, fingerprints = select_changed_storms(
+                            batch, fingerprints, engine
+                        )
+                        s.rows_out = len(fingerprints)
+                    logger.info(
+                        f"Found {len(fingerprints)} new or changed storms."
+                    )
+                    if len(fingerprints) == 0:
+                        checkpoint.complete_unit(unit)
+                        continue
+
+                storm_tracks, tracks_geo = extract_batch(batch, **cache)
+                load_unit(
+                    storm_tracks,
+                    tracks_geo,
+                    engine,
+                    chunksize,
+                    load_method,
+                    workers,
+                    checkpoint,
+                    unit,
+                    fingerprints=fingerprints if incremental else None,
+                    tile_cache=tile_cache,
+                )
+
+        refresh_summaries(engine)
 
-        # Process tracks and add them to the database
-        process_tracks(dataset=dataset, engine=engine, chunksize=chunksize)
+        if upload_needed:
+            upload.result()
+            checkpoint.complete_stage("blob_upload")
 
+        # Only now is the download's content loaded, so conditional
+        # requests of the next runs can skip it
+        commit_manifest(path)
+        checkpoint.clear()
         logger.info("Pipeline successfully finished!")
 
     except Exception as e:
+        error = e
         logger.error(f"An error occurred: {e}", exc_info=True)
         raise
+    finally:
+        uploader.shutdown()
+        run.finish(error)
+        for stage in run.stages():
+            logger.info(
+                f"{stage['stage']}: {stage['duration_s']:.1f}s over "
+                f"{stage['spans']} span(s), {stage.get('rows_out', '-')} "
+                "rows out."
+            )
+            if "rows_inserted" in stage:
+                logger.info(
+                    f"{stage['stage']}: {stage['rows_inserted']} inserted, "
+                    f"{stage['rows_updated']} updated, "
+                    f"{stage['rows_unchanged']} unchanged."
+                )
+        if metrics_report:
+            run.write_report(metrics_report)
+        if prometheus_textfile:
+            run.write_prometheus(prometheus_textfile)
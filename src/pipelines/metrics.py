@@ -0,0 +1,297 @@
+"""
+Per-stage metrics for pipeline runs: timings, row counts, bytes and memory.
+
+A run is started with `start_run`, and any code can then time a stage with
+`span`, from any thread, much like logging to a module-level logger:
+
+    run = start_run("ibtracs")
+    with span("extract_tracks") as s:
+        tracks = extract_tracks(dataset)
+        s.rows_out = len(tracks)
+    run.finish()
+    run.write_report("report.json")
+
+Spans opened while no run is active (e.g. in worker processes) are timed
+but not recorded.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+_lock = threading.Lock()
+_current = None
+
+# Span fields that are summed over a stage
+COUNTERS = [
+    "rows_in",
+    "rows_out",
+    "bytes_read",
+    "bytes_written",
+    "rows_inserted",
+    "rows_updated",
+    "rows_unchanged",
+    "rss_growth_bytes",
+]
+# Seconds between samples of the process RSS while spans are open
+RSS_SAMPLE_INTERVAL = 0.05
+
+
+@dataclass
+class Span:
+    stage: str
+    labels: dict = field(default_factory=dict)
+    started_at: str = ""
+    duration_s: float = 0.0
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    bytes_read: Optional[int] = None
+    bytes_written: Optional[int] = None
+    # Outcome of database merges, where the load method reports it
+    rows_inserted: Optional[int] = None
+    rows_updated: Optional[int] = None
+    rows_unchanged: Optional[int] = None
+    # Peak of Python allocations while the span was open, with trace_memory
+    tracemalloc_peak_bytes: Optional[int] = None
+    # Highest process RSS sampled while the span was open
+    rss_peak_bytes: Optional[int] = None
+    # How much the span raised the process' RSS high-water mark, which
+    # catches spikes between samples
+    rss_growth_bytes: Optional[int] = None
+
+
+def _rss_peak_bytes():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _rss_bytes():
+    """
+    Current RSS of the process, or its high-water mark where /proc isn't
+    available
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return _rss_peak_bytes()
+
+
+class RunMetrics:
+    def __init__(self, pipeline, trace_memory=False, **parameters):
+        self.pipeline = pipeline
+        self.parameters = parameters
+        self.trace_memory = trace_memory
+        self.spans = []
+        self.started_at = datetime.now(timezone.utc)
+        self.duration_s = None
+        self.error = None
+        self._start = time.perf_counter()
+        # Open spans by id, with the RSS high-water mark when they opened
+        self._open_spans = {}
+        self._sampling = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+        self._sampler.start()
+
+    def _sample_rss(self):
+        """
+        Raise the RSS peak of open spans to the current RSS, until the run
+        finishes
+        """
+        while not self._sampling.wait(RSS_SAMPLE_INTERVAL):
+            rss = _rss_bytes()
+            with _lock:
+                for span, _ in self._open_spans.values():
+                    span.rss_peak_bytes = max(span.rss_peak_bytes, rss)
+
+    def _open(self, span):
+        with _lock:
+            # tracemalloc has a single peak: only reset it when no other span
+            # is running, so overlapping spans share the peak since the
+            # earliest of them started
+            if self.trace_memory and not self._open_spans:
+                tracemalloc.reset_peak()
+            span.rss_peak_bytes = _rss_bytes()
+            self._open_spans[id(span)] = (span, _rss_peak_bytes())
+
+    def _close(self, span):
+        with _lock:
+            _, high_water_mark = self._open_spans.pop(id(span))
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                span.tracemalloc_peak_bytes = peak
+            span.rss_peak_bytes = max(span.rss_peak_bytes, _rss_bytes())
+            span.rss_growth_bytes = _rss_peak_bytes() - high_water_mark
+            self.spans.append(span)
+
+    def finish(self, error=None):
+        """
+        Stop the run, recording `error` if it failed
+        """
+        global _current
+        self.duration_s = time.perf_counter() - self._start
+        self.error = None if error is None else repr(error)
+        self._sampling.set()
+        if self.trace_memory:
+            tracemalloc.stop()
+        with _lock:
+            if _current is self:
+                _current = None
+
+    def stages(self):
+        """
+        Spans aggregated by stage, in the order stages first ran
+        """
+        stages = {}
+        for s in sorted(self.spans, key=lambda s: s.started_at):
+            stage = stages.setdefault(
+                s.stage,
+                {"stage": s.stage, "spans": 0, "duration_s": 0.0},
+            )
+            stage["spans"] += 1
+            stage["duration_s"] += s.duration_s
+            for key in COUNTERS:
+                if getattr(s, key) is not None:
+                    stage[key] = stage.get(key, 0) + getattr(s, key)
+            for key in ["tracemalloc_peak_bytes", "rss_peak_bytes"]:
+                if getattr(s, key) is not None:
+                    stage[key] = max(stage.get(key, 0), getattr(s, key))
+        return list(stages.values())
+
+    def report(self):
+        return {
+            "pipeline": self.pipeline,
+            "parameters": self.parameters,
+            "started_at": self.started_at.isoformat(),
+            "duration_s": self.duration_s,
+            "success": self.error is None,
+            "error": self.error,
+            "rss_peak_bytes": _rss_peak_bytes(),
+            "stages": self.stages(),
+            "spans": [asdict(s) for s in self.spans],
+        }
+
+    def write_report(self, path):
+        """
+        Write the run report as JSON
+        """
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2, default=str)
+
+    def write_prometheus(self, path, prefix="cyclones"):
+        """
+        Write the run's metrics in the Prometheus text format, for the
+        node_exporter textfile collector. The file is replaced atomically so
+        the collector never reads a partial file
+        """
+        pipeline = f'pipeline="{self.pipeline}"'
+        lines = []
+
+        def metric(name, help, samples):
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{{{labels}}} {value}")
+
+        stages = self.stages()
+        for key, name, help in [
+            ("duration_s", "stage_duration_seconds", "Time spent in stage"),
+            ("rows_in", "stage_rows_in", "Rows read by stage"),
+            ("rows_out", "stage_rows_out", "Rows produced by stage"),
+            ("bytes_read", "stage_bytes_read", "Bytes read by stage"),
+            ("bytes_written", "stage_bytes_written", "Bytes written by stage"),
+            ("rows_inserted", "stage_rows_inserted", "Rows inserted by stage"),
+            ("rows_updated", "stage_rows_updated", "Rows updated by stage"),
+            (
+                "rows_unchanged",
+                "stage_rows_unchanged",
+                "Rows left unchanged by stage",
+            ),
+            (
+                "tracemalloc_peak_bytes",
+                "stage_tracemalloc_peak_bytes",
+                "Peak traced Python memory during stage",
+            ),
+            (
+                "rss_peak_bytes",
+                "stage_rss_peak_bytes",
+                "Peak process RSS sampled during stage",
+            ),
+            (
+                "rss_growth_bytes",
+                "stage_rss_growth_bytes",
+                "Growth of the process peak RSS during stage",
+            ),
+        ]:
+            samples = [
+                (f'{pipeline},stage="{s["stage"]}"', s[key])
+                for s in stages
+                if key in s
+            ]
+            if samples:
+                metric(name, help, samples)
+
+        metric(
+            "run_duration_seconds",
+            "Duration of the last run",
+            [(pipeline, self.duration_s or 0)],
+        )
+        metric(
+            "run_success",
+            "Whether the last run succeeded",
+            [(pipeline, int(self.error is None))],
+        )
+        metric(
+            "run_timestamp_seconds",
+            "Start time of the last run",
+            [(pipeline, self.started_at.timestamp())],
+        )
+
+        part_path = f"{path}.part"
+        with open(part_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(part_path, path)
+
+
+def start_run(pipeline, trace_memory=False, **parameters):
+    """
+    Start recording spans for a pipeline run. `parameters` are included in
+    the report as is
+    """
+    global _current
+    run = RunMetrics(pipeline, trace_memory, **parameters)
+    if trace_memory:
+        tracemalloc.start()
+    with _lock:
+        _current = run
+    return run
+
+
+@contextmanager
+def span(stage, **labels):
+    """
+    Time a stage of the current run. The yielded Span's row and byte counts
+    can be set inside the block
+    """
+    run = _current
+    s = Span(
+        stage=stage,
+        labels=labels,
+        started_at=datetime.now(timezone.utc).isoformat(),
+    )
+    if run is not None:
+        run._open(s)
+    start = time.perf_counter()
+    try:
+        yield s
+    finally:
+        s.duration_s = time.perf_counter() - start
+        if run is not None:
+            run._close(s)
@@ -0,0 +1,244 @@
+"""
+Mapbox Vector Tiles (z/x/y) of IBTrACS storm tracks rendered with ST_AsMVT,
+with an on-disk cache of rendered tiles that pipeline runs invalidate for
+the storms they changed
+"""
+
+import math
+import os
+import uuid
+
+import pandas as pd
+
+from src.pipelines.track_lines import tolerance_for_zoom
+
+# Tile coordinate space of MVT geometries
+TILE_EXTENT = 4096
+# Zoom from which tiles also hold track points, not just the storm lines
+POINTS_MIN_ZOOM = 6
+# Web Mercator doesn't reach the poles
+MAX_LATITUDE = 85.0511287798
+
+TILE_SQL = """
+WITH bounds AS (
+    SELECT
+        ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS tile,
+        ST_Transform(ST_TileEnvelope(%(z)s, %(x)s, %(y)s), 4326) AS box
+),
+lines AS (
+    SELECT sid, geometry
+    FROM storms.ibtracs_track_lines
+    WHERE tolerance = %(tolerance)s
+    UNION ALL
+    -- Lines crossing the antimeridian are stored in 0-360 longitudes, so
+    -- tiles west of it get a copy shifted back
+    SELECT sid, ST_Translate(geometry, -360, 0)
+    FROM storms.ibtracs_track_lines
+    WHERE tolerance = %(tolerance)s AND ST_XMax(geometry) > 180
+),
+tracks AS (
+    SELECT
+        l.sid,
+        s.name,
+        s.season,
+        s.peak_wind,
+        ST_AsMVTGeom(
+            ST_Transform(l.geometry, 3857), bounds.tile, %(extent)s
+        ) AS geom
+    FROM lines l
+    JOIN storms.ibtracs_storms s USING (sid), bounds
+    WHERE l.geometry && bounds.box
+),
+points AS (
+    SELECT
+        t.sid,
+        t.valid_time::text AS valid_time,
+        t.wind_speed,
+        t.pressure,
+        t.basin,
+        ST_AsMVTGeom(
+            ST_Transform(t.geometry, 3857), bounds.tile, %(extent)s
+        ) AS geom
+    FROM storms.ibtracs_tracks_geo t, bounds
+    WHERE %(points)s AND t.geometry && bounds.box
+)
+SELECT
+    COALESCE(
+        (
+            SELECT ST_AsMVT(tracks, 'tracks', %(extent)s, 'geom')
+            FROM tracks
+            WHERE geom IS NOT NULL
+        ),
+        ''::bytea
+    ) || COALESCE(
+        (
+            SELECT ST_AsMVT(points, 'points', %(extent)s, 'geom')
+            FROM points
+            WHERE geom IS NOT NULL
+        ),
+        ''::bytea
+    )
+"""
+
+
+def lonlat_to_tile(lon, lat, zoom):
+    """
+    (x, y) of the tile at `zoom` holding the point at `lon`, `lat`
+    """
+    n = 2**zoom
+    lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, lat)))
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_range(bbox, zoom):
+    """
+    Ranges of x and y (inclusive) of the tiles at `zoom` covering `bbox`
+    (xmin, ymin, xmax, ymax in degrees)
+    """
+    xmin, ymin, xmax, ymax = bbox
+    # Tile rows count from the north
+    x0, y0 = lonlat_to_tile(xmin, ymax, zoom)
+    x1, y1 = lonlat_to_tile(xmax, ymin, zoom)
+    return (x0, x1), (y0, y1)
+
+
+def render_tile(engine, z, x, y):
+    """
+    Render tile z/x/y as MVT: a `tracks` layer with the storm lines at the
+    level of detail of `z`, and from POINTS_MIN_ZOOM a `points` layer with
+    the track points
+    """
+    with engine.connect() as conn:
+        tile = conn.exec_driver_sql(
+            TILE_SQL,
+            {
+                "z": z,
+                "x": x,
+                "y": y,
+                "tolerance": tolerance_for_zoom(z),
+                "extent": TILE_EXTENT,
+                "points": z >= POINTS_MIN_ZOOM,
+            },
+        ).scalar()
+    return bytes(tile)
+
+
+def tile_path(cache_dir, z, x, y):
+    return os.path.join(cache_dir, str(z), str(x), f"{y}.mvt")
+
+
+def get_tile(engine, z, x, y, cache_dir=None):
+    """
+    Tile z/x/y as MVT bytes, from `cache_dir` if it was rendered before.
+    Tiles rendered here are stored there
+    """
+    if cache_dir is None:
+        return render_tile(engine, z, x, y)
+
+    path = tile_path(cache_dir, z, x, y)
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    tile = render_tile(engine, z, x, y)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write under a unique name first so readers never see partial files
+    part_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(part_path, "wb") as f:
+        f.write(tile)
+    os.replace(part_path, path)
+    return tile
+
+
+def storm_extents(engine, sids):
+    """
+    Bounding box and content version of each of storms `sids` in the
+    database, indexed by sid. The version combines the row hashes of the
+    storm and its track points, so it changes with anything tiles show
+    """
+    sids = sorted({str(sid) for sid in sids})
+    with engine.connect() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT
+                t.sid,
+                ST_XMin(t.extent) AS xmin,
+                ST_YMin(t.extent) AS ymin,
+                ST_XMax(t.extent) AS xmax,
+                ST_YMax(t.extent) AS ymax,
+                t.points_hash || ':' || COALESCE(s.row_hash::text, '')
+                    AS version
+            FROM (
+                SELECT
+                    sid,
+                    ST_Extent(geometry) AS extent,
+                    md5(string_agg(
+                        COALESCE(row_hash::text, ''), ','
+                        ORDER BY valid_time, storm_id
+                    )) AS points_hash
+                FROM storms.ibtracs_tracks_geo
+                WHERE sid = ANY(%(sids)s)
+                GROUP BY sid
+            ) AS t
+            JOIN storms.ibtracs_storms s USING (sid)
+            """,
+            conn,
+            params={"sids": sids},
+            index_col="sid",
+        )
+
+
+def changed_extents(before, after):
+    """
+    Bounding boxes to invalidate between two `storm_extents` of the same
+    storms: where storms that are new, gone or changed were, and are now
+    """
+    versions = before["version"].reindex(after.index)
+    changed = after.index[versions.ne(after["version"]).to_numpy()]
+    gone = before.index.difference(after.index)
+    columns = ["xmin", "ymin", "xmax", "ymax"]
+    boxes = pd.concat(
+        [
+            before.loc[before.index.intersection(changed), columns],
+            before.loc[gone, columns],
+            after.loc[changed, columns],
+        ]
+    )
+    return list(boxes.itertuples(index=False, name=None))
+
+
+def invalidate_tiles(cache_dir, bboxes):
+    """
+    Delete the cached tiles, at every zoom, that intersect any of `bboxes`
+    (xmin, ymin, xmax, ymax in degrees). Only tiles in the cache are looked
+    at, however large the boxes. Returns the number of tiles deleted.
+    """
+    if not bboxes or not os.path.isdir(cache_dir):
+        return 0
+
+    deleted = 0
+    for z in os.listdir(cache_dir):
+        if not z.isdigit():
+            continue
+        ranges = [tile_range(bbox, int(z)) for bbox in bboxes]
+        for x in os.listdir(os.path.join(cache_dir, z)):
+            if not x.isdigit():
+                continue
+            x_ranges = [ys for xs, ys in ranges if xs[0] <= int(x) <= xs[1]]
+            if not x_ranges:
+                continue
+            for name in os.listdir(os.path.join(cache_dir, z, x)):
+                y, ext = os.path.splitext(name)
+                if ext != ".mvt" or not y.isdigit():
+                    continue
+                if any(y0 <= int(y) <= y1 for y0, y1 in x_ranges):
+                    try:
+                        os.remove(os.path.join(cache_dir, z, x, name))
+                        deleted += 1
+                    except FileNotFoundError:
+                        pass
+    return deleted
@@ -0,0 +1,185 @@
+"""
+Storm and forecast tracks as LineStrings simplified at several tolerances,
+so maps fetch one line at the level of detail of their zoom rather than
+every track point
+"""
+
+import geopandas as gpd
+
+from src.pipelines.metrics import span
+
+# Simplification tolerances in degrees, 0 being the full track
+TOLERANCES = [0.0, 0.01, 0.05, 0.25]
+# Width in pixels of a web map tile, which spans 360 / 2 ** zoom degrees
+TILE_SIZE = 256
+
+FORECAST_KEYS = ["storm_id", "issue_time", "provider", "ensemble_member"]
+
+
+def tolerance_for_zoom(zoom, tile_size=TILE_SIZE):
+    """
+    Largest tolerance in TOLERANCES that stays under one pixel at `zoom`,
+    i.e. whose simplification can't be seen on the map
+    """
+    pixel = 360 / (tile_size * 2**zoom)
+    return max(t for t in TOLERANCES if t <= pixel)
+
+
+def _rebuild_lines(engine, table, source, keys, point, where, params):
+    """
+    Replace the lines in `table` of the tracks in `source` matching `where`:
+    one line per `keys` through `point` in order of valid time, at each of
+    TOLERANCES. Tracks with a single point have no line.
+
+    Lines spanning over 180 degrees of longitude cross the antimeridian, and
+    are shifted to 0-360 so they don't wrap around the map.
+
+    Returns the number of lines written.
+    """
+    columns = ", ".join(keys)
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.exec_driver_sql(
+                f"DELETE FROM storms.{table} WHERE {where}", params
+            )
+            result = conn.exec_driver_sql(
+                f"""
+                INSERT INTO storms.{table}
+                    ({columns}, tolerance, points, geometry)
+                SELECT {columns}, tolerance, ST_NPoints(simple), simple
+                FROM (
+                    SELECT {columns},
+                        ST_MakeLine(point ORDER BY valid_time) AS line
+                    FROM (
+                        SELECT DISTINCT ON ({columns}, valid_time)
+                            {columns}, valid_time, {point} AS point
+                        FROM storms.{source}
+                        WHERE {where}
+                        ORDER BY {columns}, valid_time
+                    ) AS points
+                    GROUP BY {columns}
+                    HAVING COUNT(*) > 1
+                ) AS lines
+                CROSS JOIN unnest(%(tolerances)s::float8[]) AS tolerance
+                CROSS JOIN LATERAL (
+                    SELECT ST_SimplifyPreserveTopology(
+                        CASE WHEN ST_XMax(line) - ST_XMin(line) > 180
+                            THEN ST_ShiftLongitude(line)
+                            ELSE line
+                        END,
+                        tolerance
+                    ) AS simple
+                ) AS simplified
+                """,
+                {**params, "tolerances": TOLERANCES},
+            )
+            return result.rowcount
+
+
+def build_track_lines(engine, sids):
+    """
+    Rebuild the lines of IBTrACS storms `sids` from their track points in
+    storms.ibtracs_tracks_geo
+    """
+    sids = sorted({str(sid) for sid in sids})
+    if not sids:
+        return 0
+    with span("track_lines", table="ibtracs_track_lines") as s:
+        s.rows_in = len(sids)
+        s.rows_out = _rebuild_lines(
+            engine,
+            table="ibtracs_track_lines",
+            source="ibtracs_tracks_geo",
+            keys=["sid"],
+            point="geometry",
+            where="sid = ANY(%(sids)s)",
+            params={"sids": sids},
+        )
+    return s.rows_out
+
+
+def build_forecast_lines(engine, tracks):
+    """
+    Rebuild the lines of the forecasts in `tracks` (each storm and issue
+    time in it) from their points in storms.forecast_tracks
+    """
+    forecasts = tracks[["storm_id", "issue_time"]].drop_duplicates()
+    with span("track_lines", table="forecast_track_lines") as s:
+        s.rows_in = len(forecasts)
+        s.rows_out = _rebuild_lines(
+            engine,
+            table="forecast_track_lines",
+            source="forecast_tracks",
+            keys=FORECAST_KEYS,
+            point="ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)",
+            where=(
+                "storm_id = ANY(%(storm_ids)s) "
+                "AND issue_time = ANY(%(issue_times)s)"
+            ),
+            params={
+                "storm_ids": forecasts["storm_id"].unique().tolist(),
+                "issue_times": list(
+                    forecasts["issue_time"]
+                    .drop_duplicates()
+                    .dt.to_pydatetime()
+                ),
+            },
+        )
+    return s.rows_out
+
+
+def _read_lines(engine, table, zoom, where, params, bbox=None):
+    tolerance = tolerance_for_zoom(zoom)
+    sql = f"SELECT * FROM storms.{table} WHERE tolerance = %(tolerance)s"
+    if where:
+        sql += f" AND {where}"
+    if bbox is not None:
+        sql += (
+            " AND geometry && ST_MakeEnvelope("
+            "%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 4326)"
+        )
+        params = {
+            **params,
+            **dict(zip(["xmin", "ymin", "xmax", "ymax"], bbox)),
+        }
+    with engine.connect() as conn:
+        return gpd.read_postgis(
+            sql,
+            conn,
+            geom_col="geometry",
+            params={**params, "tolerance": tolerance},
+        )
+
+
+def read_track_lines(engine, zoom, sids=None, bbox=None):
+    """
+    Lines of IBTrACS storms at the level of detail of map zoom `zoom`, for
+    storms `sids` (default: all) intersecting `bbox` (xmin, ymin, xmax,
+    ymax in degrees) if given
+    """
+    if sids is None:
+        return _read_lines(engine, "ibtracs_track_lines", zoom, None, {}, bbox)
+    return _read_lines(
+        engine,
+        "ibtracs_track_lines",
+        zoom,
+        "sid = ANY(%(sids)s)",
+        {"sids": [str(sid) for sid in sids]},
+        bbox,
+    )
+
+
+def read_forecast_lines(engine, zoom, storm_id, issue_time=None, bbox=None):
+    """
+    Lines of the forecasts of storm `storm_id` at the level of detail of map
+    zoom `zoom`: every ensemble member of every forecast, or only those
+    issued at `issue_time`
+    """
+    where = "storm_id = %(storm_id)s"
+    params = {"storm_id": storm_id}
+    if issue_time is not None:
+        where += " AND issue_time = %(issue_time)s"
+        params["issue_time"] = issue_time
+    return _read_lines(
+        engine, "forecast_track_lines", zoom, where, params, bbox
+    )
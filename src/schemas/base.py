@@ -1,39 +1,66 @@
+from contextlib import contextmanager
 from sqlalchemy.orm import declarative_base
 import pandas as pd
+import gc
 import json
 
 
 Base = declarative_base()
 
 
-def handle_array_columns(
-    df: pd.DataFrame, array_columns: list
-) -> pd.DataFrame:
-    """Convert array-like columns to proper format for PostgreSQL."""
-    df = df.copy()
-    for col in array_columns:
-        if col in df.columns:
-            df[col] = df[col].apply(lambda x: x if isinstance(x, list) else [])
-    return df
-
+@contextmanager
+def _gc_paused():
+    """
+    Pause the cyclic garbage collector, which allocating millions of small
+    containers triggers over and over although none of them is garbage
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
 
-def handle_json_columns(df: pd.DataFrame, json_columns: list) -> pd.DataFrame:
-    """Convert dict columns to proper JSON format for PostgreSQL"""
-    df = df.copy()
-    for col in json_columns:
-        if col in df.columns:
-            df[col] = df[col].apply(json.dumps)
-    return df
 
-
-def handle_datetime_columns(
-    df: pd.DataFrame, datetime_columns: list
+def normalize_dataframe(
+    df: pd.DataFrame,
+    datetime_columns: list = (),
+    array_columns: list = (),
+    json_columns: list = (),
 ) -> pd.DataFrame:
-    """Convert datetime columns to UTC."""
-    df = df.copy()
-    for col in datetime_columns:
-        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(
-            df[col]
-        ):
-            df[col] = pd.to_datetime(df[col], utc=True)
-    return df
+    """
+    Prepare a DataFrame for PostgreSQL in a single pass.
+
+    Each column is converted at most once and the result shares unchanged
+    columns with the input:
+    - datetime columns are converted to UTC
+    - cells of array columns that aren't lists become an empty list
+    - JSON columns are serialized with json.dumps
+    - missing values in other columns become None
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if col in json_columns:
+            series = pd.Series(
+                [json.dumps(x) for x in series], index=df.index, dtype=object
+            )
+        elif col in array_columns:
+            # Like the legacy apply, any cell that isn't a list (missing
+            # values, but also tuples, arrays or scalars) becomes an empty
+            # list of its own, so cells can be mutated independently
+            with _gc_paused():
+                values = [x if isinstance(x, list) else [] for x in series]
+            series = pd.Series(values, index=df.index, dtype=object)
+        elif col in datetime_columns:
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                series = pd.to_datetime(series, utc=True)
+        elif not pd.api.types.is_datetime64_any_dtype(series):
+            missing = series.isna().to_numpy()
+            if missing.any():
+                values = series.to_numpy(dtype=object, copy=True)
+                values[missing] = None
+                series = pd.Series(values, index=df.index, dtype=object)
+        columns[col] = series
+    return pd.DataFrame(columns, index=df.index, copy=False)
@@ -1,14 +1,24 @@
 from .base import Base
 
+from pathlib import Path
+from typing import Iterable
 from sqlalchemy import text
 from sqlalchemy.exc import ProgrammingError
 from dotenv import load_dotenv
 
 load_dotenv()
 
+SQL_DIR = Path(__file__).parent / "sql"
 
-def init_db(engine) -> None:
-    """Initialize the database with schema and tables."""
+
+def init_db(engine, partition_years: Iterable[int] = ()) -> None:
+    """
+    Initialize the database with schema and tables.
+
+    Partitioned tables are created as parents only. Their yearly partitions
+    are created for `partition_years` here, and on demand by each model's
+    `from_dataframe`.
+    """
     try:
         with engine.connect() as conn:
             with conn.begin():
@@ -18,9 +28,39 @@ def init_db(engine) -> None:
 
     Base.metadata.create_all(engine)
 
+    with engine.connect() as conn:
+        with conn.begin():
+            for mapper in Base.registry.mappers:
+                if hasattr(mapper.class_, "__partition_column__"):
+                    ensure_partitions(conn, mapper.class_, partition_years)
+
+
+def ensure_partitions(conn, model, years: Iterable[int]) -> None:
+    """
+    Create the yearly range partitions of `model`'s table that do not exist.
+
+    Partition `<table>_<year>` holds rows whose `__partition_column__` falls
+    in that calendar year.
+    """
+    table = model.__table__
+    for year in sorted({int(year) for year in years}):
+        conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {table.schema}.{table.name}_{year} "
+            f"PARTITION OF {table.schema}.{table.name} "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        )
+
 
 def drop_all(engine) -> None:
     """Drop all tables and schema."""
     with engine.connect() as conn:
         with conn.begin():
             conn.execute(text("DROP SCHEMA IF EXISTS storms CASCADE;"))
+
+
+def execute_sql_file(engine, name: str) -> None:
+    """Run one of the DDL files in `src/schemas/sql` by name."""
+    sql = (SQL_DIR / f"{name}.sql").read_text()
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.exec_driver_sql(sql)
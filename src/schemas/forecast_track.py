@@ -8,23 +8,26 @@ from sqlalchemy import (
     Index,
     UniqueConstraint,
 )
-from .base import Base
+from .base import Base, normalize_dataframe
+from .database import ensure_partitions
 import pandas as pd
 from datetime import datetime
-from typing import Optional
-import numpy as np
+from typing import Iterator, Optional, Tuple
 
 
 class ForecastTrack(Base):
     __tablename__ = "forecast_tracks"
+    # Range-partitioned by year of issue_time; see ensure_partitions
+    __partition_column__ = "issue_time"
 
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     storm_id = Column(
         String(50),
         ForeignKey("storms.storms.storm_id", ondelete="CASCADE"),
         nullable=False,
     )
-    issue_time = Column(DateTime, nullable=False)
+    # Part of the primary key, as the partition key must be
+    issue_time = Column(DateTime, primary_key=True, nullable=False)
     valid_time = Column(DateTime, nullable=False)
 
     # Position and intensity
@@ -37,6 +40,8 @@ class ForecastTrack(Base):
 
     # Forecast-specific fields
     uncertainty = Column(Float)
+    # 0 for deterministic forecasts and the ensemble control
+    ensemble_member = Column(Integer, nullable=False, server_default="0")
 
     # Classification
     category = Column(String(20))
@@ -53,9 +58,10 @@ class ForecastTrack(Base):
             "issue_time",
             "valid_time",
             "provider",
+            "ensemble_member",
             name="uq_forecast_track",
         ),
-        {"schema": "storms"},
+        {"schema": "storms", "postgresql_partition_by": "RANGE (issue_time)"},
     )
 
     @classmethod
@@ -70,22 +76,17 @@ class ForecastTrack(Base):
             engine: SQLAlchemy engine
             chunk_size: Number of records to insert at once
         """
-        # Ensure datetime columns are in UTC
-        for col in ["issue_time", "valid_time"]:
-            if not pd.api.types.is_datetime64_any_dtype(df[col]):
-                df[col] = pd.to_datetime(df[col], utc=True)
-
-        # Handle array data
-        for col in ["wind_radii", "wind_radii_quadrants"]:
-            if col in df.columns:
-                df[col] = df[col].apply(
-                    lambda x: x if isinstance(x, list) else []
-                )
-
-        df = df.replace({np.nan: None})
+        df = normalize_dataframe(
+            df,
+            datetime_columns=["issue_time", "valid_time"],
+            array_columns=["wind_radii", "wind_radii_quadrants"],
+        )
 
         with engine.connect() as conn:
             with conn.begin():
+                ensure_partitions(
+                    conn, cls, df["issue_time"].dropna().dt.year.unique()
+                )
                 df.to_sql(
                     cls.__tablename__,
                     conn,
@@ -97,19 +98,16 @@ class ForecastTrack(Base):
                 )
 
     @classmethod
-    def to_dataframe(
+    def _select_query(
         cls,
-        engine,
         storm_id: Optional[str] = None,
         issue_time: Optional[datetime] = None,
         start_valid_time: Optional[datetime] = None,
         end_valid_time: Optional[datetime] = None,
         provider: Optional[str] = None,
-    ) -> pd.DataFrame:
-        """
-        Retrieve forecast tracks as a DataFrame.
-        """
-        query = "SELECT * FROM forecast_tracks WHERE 1=1"
+    ) -> Tuple[str, dict]:
+        """Build the filtered SELECT shared by the read methods."""
+        query = f"SELECT * FROM storms.{cls.__tablename__} WHERE 1=1"
         params = {}
 
         if storm_id:
@@ -133,10 +131,63 @@ class ForecastTrack(Base):
             params["provider"] = provider
 
         query += " ORDER BY storm_id, issue_time, valid_time"
+        return query, params
 
+    @classmethod
+    def to_dataframe(
+        cls,
+        engine,
+        storm_id: Optional[str] = None,
+        issue_time: Optional[datetime] = None,
+        start_valid_time: Optional[datetime] = None,
+        end_valid_time: Optional[datetime] = None,
+        provider: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Retrieve forecast tracks as a DataFrame.
+        """
+        query, params = cls._select_query(
+            storm_id, issue_time, start_valid_time, end_valid_time, provider
+        )
         return pd.read_sql_query(
             query,
             engine,
             params=params,
             parse_dates=["issue_time", "valid_time", "created_at"],
         )
+
+    @classmethod
+    def iter_dataframe(
+        cls,
+        engine,
+        storm_id: Optional[str] = None,
+        issue_time: Optional[datetime] = None,
+        start_valid_time: Optional[datetime] = None,
+        end_valid_time: Optional[datetime] = None,
+        provider: Optional[str] = None,
+        batch_size: int = 50000,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Retrieve forecast tracks as DataFrames of up to `batch_size` rows.
+
+        Rows are fetched through a server-side (named) cursor, so only one
+        batch is held in memory at a time.
+
+        Args:
+            engine: SQLAlchemy engine
+            batch_size: Number of rows per DataFrame
+        """
+        query, params = cls._select_query(
+            storm_id, issue_time, start_valid_time, end_valid_time, provider
+        )
+        with engine.connect() as conn:
+            conn = conn.execution_options(
+                stream_results=True, max_row_buffer=batch_size
+            )
+            yield from pd.read_sql_query(
+                query,
+                conn,
+                params=params,
+                parse_dates=["issue_time", "valid_time", "created_at"],
+                chunksize=batch_size,
+            )
@@ -7,14 +7,20 @@ from sqlalchemy import (
     Index,
     UniqueConstraint,
     ARRAY,
+    func,
 )
-from .base import Base, handle_array_columns, handle_datetime_columns
+from .base import Base, normalize_dataframe
+from .database import ensure_partitions
+import geopandas as gpd
 import pandas as pd
-import numpy as np
+from datetime import datetime
+from typing import List, Optional, Tuple
 
 
 class ObservedTrack(Base):
     __tablename__ = "observed_tracks"
+    # Range-partitioned by year of valid_time; see ensure_partitions
+    __partition_column__ = "valid_time"
 
     point_id = Column(String(50), primary_key=True)
     sid = Column(
@@ -22,7 +28,8 @@ class ObservedTrack(Base):
         ForeignKey("storms.storms.sid", ondelete="CASCADE"),
         nullable=False,
     )
-    valid_time = Column(DateTime, nullable=False)
+    # Part of the primary key, as the partition key must be
+    valid_time = Column(DateTime, primary_key=True, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
 
@@ -50,22 +57,28 @@ class ObservedTrack(Base):
         Index("idx_observed_tracks_time", "valid_time"),
         Index("idx_observed_tracks_storm_time", "sid", "valid_time"),
         UniqueConstraint("sid", "valid_time", name="uq_observed_track"),
-        {"schema": "storms"},
+        {"schema": "storms", "postgresql_partition_by": "RANGE (valid_time)"},
     )
 
     @classmethod
     def from_dataframe(
         cls, df: pd.DataFrame, engine, chunk_size: int = 1000
     ) -> None:
-        df = df.replace({np.nan: None})
-        df = handle_datetime_columns(df, ["valid_time", "created_at"])
-        df = handle_array_columns(
+        df = normalize_dataframe(
             df,
-            ["quadrant_radius_34", "quadrant_radius_50", "quadrant_radius_64"],
+            datetime_columns=["valid_time", "created_at"],
+            array_columns=[
+                "quadrant_radius_34",
+                "quadrant_radius_50",
+                "quadrant_radius_64",
+            ],
         )
 
         with engine.connect() as conn:
             with conn.begin():
+                ensure_partitions(
+                    conn, cls, df["valid_time"].dropna().dt.year.unique()
+                )
                 df.to_sql(
                     cls.__tablename__,
                     conn,
@@ -75,3 +88,88 @@ class ObservedTrack(Base):
                     method="multi",
                     chunksize=chunk_size,
                 )
+
+    @classmethod
+    def to_dataframe(
+        cls,
+        engine,
+        sids: Optional[List[str]] = None,
+        start_valid_time: Optional[datetime] = None,
+        end_valid_time: Optional[datetime] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+    ) -> pd.DataFrame:
+        """
+        Retrieve observed tracks for many storms in a single query.
+
+        Args:
+            engine: SQLAlchemy engine
+            sids: Storm ids to retrieve, matched with `sid = ANY(...)`
+            start_valid_time: Earliest valid_time to include
+            end_valid_time: Latest valid_time to include
+            bbox: (min_lon, min_lat, max_lon, max_lat) in EPSG:4326
+        """
+        query = f"SELECT * FROM storms.{cls.__tablename__} WHERE 1=1"
+        params = {}
+
+        if sids is not None:
+            query += " AND sid = ANY(%(sids)s)"
+            params["sids"] = list(sids)
+
+        if start_valid_time:
+            query += " AND valid_time >= %(start_valid_time)s"
+            params["start_valid_time"] = start_valid_time
+
+        if end_valid_time:
+            query += " AND valid_time <= %(end_valid_time)s"
+            params["end_valid_time"] = end_valid_time
+
+        if bbox:
+            # Same expression as idx_observed_tracks_geom so the index is used
+            query += (
+                " AND ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)"
+                " && ST_MakeEnvelope(%(min_lon)s, %(min_lat)s,"
+                " %(max_lon)s, %(max_lat)s, 4326)"
+            )
+            params.update(
+                zip(["min_lon", "min_lat", "max_lon", "max_lat"], bbox)
+            )
+
+        query += " ORDER BY sid, valid_time"
+
+        return pd.read_sql_query(
+            query,
+            engine,
+            params=params,
+            parse_dates=["valid_time", "created_at"],
+            dtype={
+                column.name: "float64"
+                if isinstance(column.type, Float)
+                else "string"
+                for column in cls.__table__.columns
+                if isinstance(column.type, (Float, String))
+            },
+        )
+
+    @classmethod
+    def to_geodataframe(cls, engine, **kwargs) -> gpd.GeoDataFrame:
+        """
+        Retrieve observed tracks as points, with the same filters as
+        `to_dataframe`.
+        """
+        df = cls.to_dataframe(engine, **kwargs)
+        return gpd.GeoDataFrame(
+            df,
+            geometry=gpd.points_from_xy(df.longitude, df.latitude),
+            crs="EPSG:4326",
+        )
+
+
+# Spatial index on the track points, built from the coordinate columns
+Index(
+    "idx_observed_tracks_geom",
+    func.ST_SetSRID(
+        func.ST_MakePoint(ObservedTrack.longitude, ObservedTrack.latitude),
+        4326,
+    ),
+    postgresql_using="gist",
+)
@@ -0,0 +1,23 @@
+-- Table: storms.forecast_track_lines
+-- Each forecast's track (one per storm, issue time, provider and ensemble
+-- member) as a LineString, simplified at several tolerances (in degrees) so
+-- maps can fetch the level of detail of their zoom. Tolerance 0 is the full
+-- track
+
+CREATE TABLE IF NOT EXISTS storms.forecast_track_lines(
+    storm_id VARCHAR(50) NOT NULL,
+    issue_time TIMESTAMP NOT NULL,
+    provider VARCHAR(20),
+    ensemble_member INTEGER NOT NULL,
+    tolerance DOUBLE PRECISION NOT NULL,
+    points INTEGER NOT NULL,
+    geometry geometry(LineString,4326) NOT NULL,
+    CONSTRAINT forecast_track_lines_unique
+    UNIQUE (storm_id, issue_time, provider, ensemble_member, tolerance),
+    CONSTRAINT foreign_key_storm_id FOREIGN KEY (storm_id)
+    REFERENCES storms.storms(storm_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_forecast_track_lines_geometry
+    ON storms.forecast_track_lines USING gist
+    (geometry);
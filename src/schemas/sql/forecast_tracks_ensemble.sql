@@ -0,0 +1,24 @@
+-- Migration: ensemble_member on storms.forecast_tracks
+-- Forecasts of each ensemble member are stored side by side, so the member
+-- is part of uq_forecast_track. Adds the column to partitioned tables
+-- created before it existed, deterministic forecasts being member 0, and
+-- widens the constraint
+
+ALTER TABLE IF EXISTS storms.forecast_tracks
+    ADD COLUMN IF NOT EXISTS ensemble_member INTEGER NOT NULL DEFAULT 0;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = to_regclass('storms.forecast_tracks')
+            AND conname = 'uq_forecast_track'
+            AND cardinality(conkey) = 4
+    ) THEN
+        ALTER TABLE storms.forecast_tracks
+            DROP CONSTRAINT uq_forecast_track,
+            ADD CONSTRAINT uq_forecast_track UNIQUE (
+                storm_id, issue_time, valid_time, provider, ensemble_member
+            );
+    END IF;
+END $$;
@@ -0,0 +1,34 @@
+-- Migration: storms.forecast_tracks from before partitioning
+-- Tables created before forecast tracks were range-partitioned by issue
+-- time can't be altered into partitioned ones. Run before init_db, this
+-- renames such a table, with its indexes and id sequence, to
+-- storms.forecast_tracks_legacy so init_db creates the partitioned table;
+-- move_legacy_forecasts then moves the rows over
+
+DO $$
+DECLARE
+    index_name TEXT;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'storms' AND c.relname = 'forecast_tracks'
+            AND c.relkind = 'r'
+    ) THEN
+        -- Names of indexes and sequences are unique in the schema, and the
+        -- partitioned table takes the same ones. Renaming the index of a
+        -- constraint renames the constraint too
+        FOR index_name IN
+            SELECT indexname FROM pg_indexes
+            WHERE schemaname = 'storms' AND tablename = 'forecast_tracks'
+        LOOP
+            EXECUTE 'ALTER INDEX storms.' || quote_ident(index_name)
+                || ' RENAME TO ' || quote_ident(index_name || '_legacy');
+        END LOOP;
+        IF to_regclass('storms.forecast_tracks_id_seq') IS NOT NULL THEN
+            ALTER SEQUENCE storms.forecast_tracks_id_seq
+                RENAME TO forecast_tracks_legacy_id_seq;
+        END IF;
+        ALTER TABLE storms.forecast_tracks RENAME TO forecast_tracks_legacy;
+    END IF;
+END $$;
@@ -0,0 +1,19 @@
+-- Table: storms.ibtracs_exposure
+-- Exposure index: the storms whose track passed through each cell of a
+-- 0.1 degree grid (see src/pipelines/exposure.py for the cell numbering),
+-- with the track's minimum distance to the cell's center and its maximum
+-- wind while in the cell. Rebuilt for the storms written in each run
+
+CREATE TABLE IF NOT EXISTS storms.ibtracs_exposure(
+    cell INTEGER NOT NULL,
+    sid VARCHAR NOT NULL,
+    min_distance_km REAL NOT NULL,
+    max_wind REAL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    CONSTRAINT ibtracs_exposure_unique UNIQUE (cell, sid),
+    CONSTRAINT foreign_key_sid FOREIGN KEY (sid)
+    REFERENCES storms.ibtracs_storms(sid) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_ibtracs_exposure_sid
+    ON storms.ibtracs_exposure (sid);
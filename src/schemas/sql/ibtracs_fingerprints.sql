@@ -0,0 +1,10 @@
+-- Table: storms.ibtracs_fingerprints
+-- Hash of each storm's slice of the IBTrACS NetCDF, used to only process
+-- storms that changed since the previous run
+
+CREATE TABLE IF NOT EXISTS storms.ibtracs_fingerprints(
+    sid VARCHAR NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    CONSTRAINT ibtracs_fingerprints_unique UNIQUE (sid)
+);
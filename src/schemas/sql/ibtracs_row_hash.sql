@@ -0,0 +1,9 @@
+-- Migration: row_hash on storms.ibtracs_storms and storms.ibtracs_tracks_geo
+-- Hash of each row's content: upserts skip rows whose hash is unchanged.
+-- Adds the column to tables created before it existed
+
+ALTER TABLE IF EXISTS storms.ibtracs_storms
+    ADD COLUMN IF NOT EXISTS row_hash BIGINT;
+
+ALTER TABLE IF EXISTS storms.ibtracs_tracks_geo
+    ADD COLUMN IF NOT EXISTS row_hash BIGINT;
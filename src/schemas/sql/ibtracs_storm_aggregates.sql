@@ -0,0 +1,21 @@
+-- Migration: aggregates on storms.ibtracs_storms
+-- Aggregates of each storm's track points, for listing and ranking storms
+-- without scanning storms.ibtracs_tracks_geo. Adds the columns to tables
+-- created before they existed, and indexes them
+
+ALTER TABLE IF EXISTS storms.ibtracs_storms
+    ADD COLUMN IF NOT EXISTS peak_wind INTEGER,
+    ADD COLUMN IF NOT EXISTS min_pressure INTEGER,
+    ADD COLUMN IF NOT EXISTS first_valid_time TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS last_valid_time TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS duration_hours DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS basins VARCHAR[];
+
+CREATE INDEX IF NOT EXISTS idx_ibtracs_storms_peak_wind
+    ON storms.ibtracs_storms (peak_wind);
+
+CREATE INDEX IF NOT EXISTS idx_ibtracs_storms_min_pressure
+    ON storms.ibtracs_storms (min_pressure);
+
+CREATE INDEX IF NOT EXISTS idx_ibtracs_storms_basins
+    ON storms.ibtracs_storms USING gin (basins);
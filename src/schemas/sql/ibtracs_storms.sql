@@ -8,6 +8,14 @@ CREATE TABLE IF NOT EXISTS storms.ibtracs_storms(
     genesis_basin VARCHAR NOT NULL,
     provisional BOOLEAN NOT NULL,
     storm_id VARCHAR,-- TODO: check with Hannah
+    row_hash BIGINT,
+    -- Aggregates of the storm's track points
+    peak_wind INTEGER,
+    min_pressure INTEGER,
+    first_valid_time TIMESTAMP,
+    last_valid_time TIMESTAMP,
+    duration_hours DOUBLE PRECISION,
+    basins VARCHAR[],
     -- ocha-lens (datasources/ibtracs) unique=["sid", "storm_id"],
     -- the dataset contains empty storm_ids breaking this constraint
     CONSTRAINT ibtracs_storms_unique UNIQUE (sid)
@@ -17,4 +25,4 @@ CREATE TABLE IF NOT EXISTS storms.ibtracs_storms(
 TABLESPACE pg_default;
 
 ALTER TABLE IF EXISTS storms.ibtracs_storms
-    OWNER to {owner};
\ No newline at end of file
+    OWNER to {owner};
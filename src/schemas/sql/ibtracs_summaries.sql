@@ -0,0 +1,44 @@
+-- Materialized views: storms.ibtracs_*_summary
+-- Pre-aggregated IBTrACS counts for dashboards, refreshed at the end of each
+-- pipeline run. Each view has a unique index so it can be refreshed
+-- CONCURRENTLY, without blocking readers
+
+-- Storms per season, genesis basin and track status (provisional or best)
+CREATE MATERIALIZED VIEW IF NOT EXISTS storms.ibtracs_season_basin_summary AS
+SELECT
+    season,
+    genesis_basin,
+    provisional,
+    COUNT(*) AS storms
+FROM storms.ibtracs_storms
+GROUP BY season, genesis_basin, provisional;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ibtracs_season_basin_summary
+    ON storms.ibtracs_season_basin_summary (season, genesis_basin, provisional);
+
+-- Track points and their time span per basin
+CREATE MATERIALIZED VIEW IF NOT EXISTS storms.ibtracs_basin_track_summary AS
+SELECT
+    basin,
+    COUNT(*) AS points,
+    COUNT(DISTINCT sid) AS storms,
+    MIN(valid_time) AS first_valid_time,
+    MAX(valid_time) AS last_valid_time
+FROM storms.ibtracs_tracks_geo
+GROUP BY basin;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ibtracs_basin_track_summary
+    ON storms.ibtracs_basin_track_summary (basin);
+
+-- Track points and their time span per storm
+CREATE MATERIALIZED VIEW IF NOT EXISTS storms.ibtracs_storm_track_summary AS
+SELECT
+    sid,
+    COUNT(*) AS points,
+    MIN(valid_time) AS first_valid_time,
+    MAX(valid_time) AS last_valid_time
+FROM storms.ibtracs_tracks_geo
+GROUP BY sid;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ibtracs_storm_track_summary
+    ON storms.ibtracs_storm_track_summary (sid);
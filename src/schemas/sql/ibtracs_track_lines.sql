@@ -0,0 +1,18 @@
+-- Table: storms.ibtracs_track_lines
+-- Each storm's track as a LineString, simplified at several tolerances (in
+-- degrees) so maps can fetch the level of detail of their zoom. Tolerance 0
+-- is the full track
+
+CREATE TABLE IF NOT EXISTS storms.ibtracs_track_lines(
+    sid VARCHAR NOT NULL,
+    tolerance DOUBLE PRECISION NOT NULL,
+    points INTEGER NOT NULL,
+    geometry geometry(LineString,4326) NOT NULL,
+    CONSTRAINT ibtracs_track_lines_unique UNIQUE (sid, tolerance),
+    CONSTRAINT foreign_key_sid FOREIGN KEY (sid)
+    REFERENCES storms.ibtracs_storms(sid) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_ibtracs_track_lines_geometry
+    ON storms.ibtracs_track_lines USING gist
+    (geometry);
@@ -20,6 +20,7 @@ CREATE TABLE IF NOT EXISTS storms.ibtracs_tracks_geo(
     point_id VARCHAR NOT NULL,
     storm_id VARCHAR,
     geometry geometry(Point,4326) NOT NULL,
+    row_hash BIGINT,
     CONSTRAINT ibtracs_tracks_geo_unique UNIQUE (sid, storm_id, valid_time),
 	CONSTRAINT foreign_key_sid FOREIGN KEY (sid)
 	REFERENCES storms.ibtracs_storms(sid)
@@ -28,6 +29,7 @@ TABLESPACE pg_default;
 
 ALTER TABLE IF EXISTS storms.ibtracs_tracks_geo
     OWNER to {owner};
+
 -- Index: idx_ibtracs_tracks_geo_geometry
 
 -- DROP INDEX IF EXISTS storms.idx_ibtracs_tracks_geo_geometry;
@@ -0,0 +1,21 @@
+-- Migration: aggregates on storms.storms
+-- Aggregates of each storm's forecast points (see Storm). create_all only
+-- creates missing tables, so this adds the columns and their indexes to
+-- tables created before they existed
+
+ALTER TABLE IF EXISTS storms.storms
+    ADD COLUMN IF NOT EXISTS peak_wind DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS min_pressure DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS first_valid_time TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS last_valid_time TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS duration_hours DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS basins VARCHAR(20)[];
+
+CREATE INDEX IF NOT EXISTS idx_storms_peak_wind
+    ON storms.storms (peak_wind);
+
+CREATE INDEX IF NOT EXISTS idx_storms_min_pressure
+    ON storms.storms (min_pressure);
+
+CREATE INDEX IF NOT EXISTS idx_storms_basins
+    ON storms.storms USING gin (basins);
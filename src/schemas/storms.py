@@ -6,10 +6,11 @@ from sqlalchemy import (
     Index,
     UniqueConstraint,
     Boolean,
+    Float,
+    ARRAY,
 )
-from .base import Base, handle_datetime_columns
+from .base import Base, normalize_dataframe
 import pandas as pd
-import numpy as np
 
 
 class Storm(Base):
@@ -23,10 +24,20 @@ class Storm(Base):
     name = Column(String(100))
     genesis_basin = Column(String(20))
     provisional = Column(Boolean)
+    # Aggregates of the storm's track points
+    peak_wind = Column(Float)
+    min_pressure = Column(Float)
+    first_valid_time = Column(DateTime)
+    last_valid_time = Column(DateTime)
+    duration_hours = Column(Float)
+    basins = Column(ARRAY(String(20)))
     created_at = Column(DateTime, server_default="NOW()", nullable=False)
 
     __table_args__ = (
         Index("idx_storms_name", "name"),
+        Index("idx_storms_peak_wind", "peak_wind"),
+        Index("idx_storms_min_pressure", "min_pressure"),
+        Index("idx_storms_basins", "basins", postgresql_using="gin"),
         UniqueConstraint("storm_id", name="uq_storm_id"),
         {"schema": "storms"},
     )
@@ -35,8 +46,9 @@ class Storm(Base):
     def from_dataframe(
         cls, df: pd.DataFrame, engine, chunk_size: int = 1000
     ) -> None:
-        df = df.replace({np.nan: None})
-        df = handle_datetime_columns(df, ["created_at"])
+        df = normalize_dataframe(
+            df, datetime_columns=["created_at"], array_columns=["basins"]
+        )
 
         with engine.connect() as conn:
             with conn.begin():
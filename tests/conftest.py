@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+# Tests marked `postgis` run against the database at POSTGIS_URL, whose
+# storms schema they drop, so point it at a throwaway PostGIS
+POSTGIS_URL = os.getenv("POSTGIS_URL")
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "postgis: needs a throwaway PostGIS database at POSTGIS_URL"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if POSTGIS_URL:
+        return
+    skip = pytest.mark.skip(reason="POSTGIS_URL is not set")
+    for item in items:
+        if "postgis" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def postgis_engine():
+    from sqlalchemy import create_engine
+
+    from benchmarks.stages import reset_database
+    from src.schemas.database import drop_all
+
+    engine = create_engine(POSTGIS_URL)
+    reset_database(engine)
+    yield engine
+    drop_all(engine)
+    engine.dispose()
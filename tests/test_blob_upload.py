@@ -0,0 +1,109 @@
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobBlock
+
+from src.pipelines.blob_upload import BLOCK_SIZE, upload_file_in_blocks
+
+
+class FakeBlob:
+    """
+    Block blob keeping staged blocks until their list is committed, like
+    the service does
+    """
+
+    def __init__(self, fail_after=None):
+        self.staged = {}
+        self.committed = None
+        self.content_type = None
+        self.stage_calls = []
+        self.fail_after = fail_after
+
+    def get_block_list(self, block_list_type):
+        if self.committed is None and not self.staged:
+            raise ResourceNotFoundError("The specified blob does not exist.")
+        uncommitted = []
+        for block_id, data in self.staged.items():
+            block = BlobBlock(block_id=block_id)
+            block.size = len(data)
+            uncommitted.append(block)
+        return [], uncommitted
+
+    def stage_block(self, block_id, data):
+        if self.fail_after is not None and (
+            len(self.stage_calls) >= self.fail_after
+        ):
+            raise ConnectionResetError("connection reset")
+        self.stage_calls.append(block_id)
+        self.staged[block_id] = bytes(data)
+
+    def commit_block_list(self, block_list, content_settings=None):
+        self.committed = b"".join(
+            self.staged.pop(block.id) for block in block_list
+        )
+        self.staged.clear()
+        self.content_type = content_settings.content_type
+
+
+class FakeContainer:
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob_client(self, blob_name):
+        return self.blobs.setdefault(blob_name, FakeBlob())
+
+
+@pytest.fixture
+def big_file(tmp_path):
+    path = tmp_path / "IBTrACS.ALL.v04r01.nc"
+    path.write_bytes(bytes(range(256)) * (BLOCK_SIZE // 256 * 2 + 1))
+    return path
+
+
+def test_upload_in_8mib_blocks(big_file):
+    container = FakeContainer()
+    uploaded = upload_file_in_blocks(
+        big_file, "ibtracs/IBTrACS.ALL.v04r01.nc", container
+    )
+
+    blob = container.blobs["ibtracs/IBTrACS.ALL.v04r01.nc"]
+    assert uploaded == 3
+    assert blob.committed == big_file.read_bytes()
+    assert blob.content_type == "application/octet-stream"
+    assert len(set(blob.stage_calls)) == 3
+
+
+def test_resume_from_staged_blocks(big_file):
+    container = FakeContainer()
+    blob = container.blobs["ibtracs.nc"] = FakeBlob(fail_after=2)
+    with pytest.raises(ConnectionResetError):
+        upload_file_in_blocks(big_file, "ibtracs.nc", container)
+    assert blob.committed is None
+    assert len(blob.staged) == 2
+
+    blob.fail_after = None
+    staged = list(blob.stage_calls)
+    uploaded = upload_file_in_blocks(big_file, "ibtracs.nc", container)
+
+    assert uploaded == 1
+    assert blob.stage_calls[:2] == staged
+    assert len(blob.stage_calls) == 3
+    assert blob.committed == big_file.read_bytes()
+
+
+def test_restage_partial_block(big_file):
+    container = FakeContainer()
+    upload_file_in_blocks(big_file, "ibtracs.nc", container, block_size=1024)
+    blob = container.blobs["ibtracs.nc"]
+    first, second = blob.stage_calls[:2]
+
+    # A block staged with another size is not reused
+    blob.committed = None
+    blob.stage_calls.clear()
+    blob.staged = {first: b"\0" * 1024, second: b"\0" * 10}
+    uploaded = upload_file_in_blocks(
+        big_file, "ibtracs.nc", container, block_size=1024
+    )
+
+    assert second in blob.stage_calls
+    assert first not in blob.stage_calls
+    assert uploaded == len(blob.stage_calls)
@@ -0,0 +1,171 @@
+import csv
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from src.pipelines.bulk_load import (
+    MergeCounts,
+    add_row_hash,
+    copy_buffer,
+    copy_upsert,
+    prepare_copy_frame,
+)
+
+
+def storms():
+    return gpd.GeoDataFrame(
+        {
+            "sid": ["2020233N14313", "2020240N10300", "2021001N00001"],
+            # Unnamed storms have no name nor storm_id
+            "name": pd.Series(["LAURA", np.nan, np.nan], dtype=object),
+            "storm_id": pd.Series(
+                ["laura_na_2020", np.nan, np.nan], dtype=object
+            ),
+            "basins": [["NA"], ["NA", "EP"], []],
+            "peak_wind": pd.array([130, None, 40], dtype="Int64"),
+        },
+        geometry=gpd.points_from_xy([-85, -60, 10], [25, 12, 0]),
+    )
+
+
+def test_row_hash_independent_of_other_rows():
+    whole = add_row_hash(storms())["row_hash"]
+
+    for i in range(3):
+        part = storms().iloc[[i]].reset_index(drop=True)
+        # A frame of unnamed storms only has all-missing string columns
+        assert part["name"].dtype == object
+        assert add_row_hash(part)["row_hash"].iloc[0] == whole.iloc[i]
+
+    unnamed = storms().iloc[1:].reset_index(drop=True)
+    assert add_row_hash(unnamed)["row_hash"].tolist() == whole[1:].tolist()
+
+
+def test_row_hash_independent_of_column_order():
+    df = storms()
+    reordered = df[list(reversed(df.columns))]
+    assert add_row_hash(df)["row_hash"].equals(
+        add_row_hash(reordered)["row_hash"]
+    )
+
+
+def test_row_hash_excludes_columns():
+    df = storms()
+    changed = storms().assign(sid=["a", "b", "c"])
+    assert not add_row_hash(df)["row_hash"].equals(
+        add_row_hash(changed)["row_hash"]
+    )
+    assert add_row_hash(df, exclude=["sid"])["row_hash"].equals(
+        add_row_hash(changed, exclude=["sid"])["row_hash"]
+    )
+
+
+def copied_rows(df):
+    return list(csv.reader(copy_buffer(prepare_copy_frame(df))))
+
+
+def test_copy_frame_arrays_and_nulls():
+    df = pd.DataFrame(
+        {
+            "sid": ["a", "b", "c"],
+            "basins": [["NA", "EP"], (), np.array([1.5, np.nan])],
+            "name": pd.Series(["LAURA", None, np.nan], dtype=object),
+            "wind": pd.array([130, None, 40], dtype="Int64"),
+        }
+    )
+
+    assert copied_rows(df) == [
+        ["a", "{NA,EP}", "LAURA", "130"],
+        ["b", "{}", "", ""],
+        ["c", "{1.5,NULL}", "", "40"],
+    ]
+
+
+def test_copy_frame_whole_floats_as_integers():
+    df = pd.DataFrame(
+        {"pressure": [960.0, np.nan], "distance": [1.5, 2.0]},
+    )
+    prepared = prepare_copy_frame(df)
+
+    assert prepared["pressure"].dtype == "Int64"
+    assert prepared["distance"].dtype == "float64"
+    assert copied_rows(df) == [["960", "1.5"], ["", "2.0"]]
+    # The frame passed in is left as it was
+    assert df["pressure"].dtype == "float64"
+
+
+def test_copy_frame_quotes_text():
+    radii = json.dumps({"ne": 30, "note": 'say "hi", then leave'})
+    df = pd.DataFrame({"sid": ["a"], "radii": [radii]})
+
+    assert copied_rows(df) == [["a", radii]]
+
+
+def test_merge_counts():
+    # 10 rows, 6 already in the table of which 2 with another hash
+    counts = MergeCounts.from_merge(rows=10, existing=6, merged=6)
+
+    assert counts == MergeCounts(inserted=4, updated=2, unchanged=4)
+    assert counts.rows == 10
+    assert MergeCounts.from_merge(3, 3, 0) == MergeCounts(0, 0, 3)
+    assert MergeCounts.from_merge(3, 0, 3) == MergeCounts(3, 0, 0)
+
+
+@pytest.mark.postgis
+def test_copy_upsert(postgis_engine):
+    engine = postgis_engine
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE storms.merge_test ("
+                "sid VARCHAR, valid_time TIMESTAMP, wind INTEGER, "
+                "basins VARCHAR[], row_hash BIGINT, "
+                "CONSTRAINT merge_test_unique UNIQUE (sid, valid_time))"
+            )
+        )
+
+    def frame(winds):
+        return add_row_hash(
+            pd.DataFrame(
+                {
+                    "sid": [sid for sid, _ in winds],
+                    "valid_time": pd.Timestamp("2020-08-26"),
+                    "wind": [wind for _, wind in winds],
+                    "basins": [["NA"]] * len(winds),
+                }
+            )
+        )
+
+    first = copy_upsert(
+        frame([("a", 50), ("b", 60), ("c", 70)]),
+        engine,
+        table="merge_test",
+        conflict_columns=["sid", "valid_time"],
+        changed_column="sid",
+    )
+    assert first == MergeCounts(3, 0, 0, frozenset({"a", "b", "c"}))
+
+    second = copy_upsert(
+        frame([("a", 50), ("b", 65), ("c", 70), ("d", 80)]),
+        engine,
+        table="merge_test",
+        conflict_columns=["sid", "valid_time"],
+        chunksize=2,
+        changed_column="sid",
+    )
+    assert second == MergeCounts(1, 1, 2, frozenset({"b", "d"}))
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT sid, wind, basins FROM storms.merge_test ORDER BY 1")
+        ).all()
+    assert [tuple(row) for row in rows] == [
+        ("a", 50, ["NA"]),
+        ("b", 65, ["NA"]),
+        ("c", 70, ["NA"]),
+        ("d", 80, ["NA"]),
+    ]
@@ -0,0 +1,25 @@
+import geopandas as gpd
+import pandas as pd
+
+from src.pipelines.cache import load_extracted, save_extracted
+
+
+def test_round_trip_restores_lists(tmp_path):
+    storms = pd.DataFrame({"sid": ["a", "b"], "basins": [["NA", "EP"], []]})
+    tracks = gpd.GeoDataFrame(
+        {"sid": ["a", "b"], "quadrant_radius_34": [[10, 20, 30, 40], []]},
+        geometry=gpd.points_from_xy([10, 20], [0, 5]),
+        crs="EPSG:4326",
+    )
+    save_extracted(str(tmp_path), "key", storms, tracks, max_bytes=10**9)
+
+    cached_storms, cached_tracks = load_extracted(str(tmp_path), "key")
+    assert cached_storms["basins"].tolist() == [["NA", "EP"], []]
+    assert cached_tracks["quadrant_radius_34"].tolist() == [
+        [10, 20, 30, 40],
+        [],
+    ]
+
+
+def test_miss(tmp_path):
+    assert load_extracted(str(tmp_path), "missing") is None
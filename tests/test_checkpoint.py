@@ -0,0 +1,141 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.pipelines import ibtracs
+from src.pipelines.bulk_load import MergeCounts
+from src.pipelines.checkpoint import Checkpoint, unit_key
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "ibtracs_ALL.checkpoint.json")
+
+
+@pytest.fixture
+def netcdf(tmp_path):
+    path = tmp_path / "IBTrACS.ALL.v04r01.nc"
+    path.write_bytes(b"netcdf v1")
+    return str(path)
+
+
+def crashed_run(path, netcdf):
+    """
+    Checkpoint of a run that downloaded `netcdf`, uploaded it, wrote unit
+    "a" and the first two chunks of unit "b" before it failed
+    """
+    checkpoint = Checkpoint(path, chunksize=2)
+    checkpoint.complete_download(netcdf)
+    checkpoint.complete_stage("blob_upload", blocks=1)
+    checkpoint.commit_chunk("ibtracs_storms", "a", 0)
+    checkpoint.complete_unit("a")
+    checkpoint.commit_chunk("ibtracs_storms", "b", 0)
+    checkpoint.commit_chunk("ibtracs_storms", "b", 1)
+    return checkpoint
+
+
+def test_unit_key_ignores_order_and_type():
+    assert unit_key([b"2020233N14313", b"2020240N10300"]) == unit_key(
+        ["2020240N10300", "2020233N14313"]
+    )
+    assert unit_key(["2020233N14313"]) != unit_key(["2020240N10300"])
+
+
+def test_resume(path, netcdf):
+    crashed_run(path, netcdf)
+
+    checkpoint = Checkpoint(path, chunksize=2, resume=True)
+    assert checkpoint.downloaded_file() == netcdf
+    assert checkpoint.stage("blob_upload") == {"blocks": 1}
+    assert checkpoint.unit_done("a")
+    assert not checkpoint.unit_done("b")
+    assert checkpoint.committed_chunks("ibtracs_storms", "b") == {0, 1}
+    assert checkpoint.committed_chunks("ibtracs_tracks_geo", "b") == set()
+
+    checkpoint.clear()
+    assert not os.path.exists(path)
+
+
+def test_discarded_without_resume(path, netcdf):
+    crashed_run(path, netcdf)
+
+    checkpoint = Checkpoint(path, chunksize=2)
+    assert checkpoint.downloaded_file() is None
+    assert not checkpoint.unit_done("a")
+    assert checkpoint.committed_chunks("ibtracs_storms", "b") == set()
+
+
+def test_chunks_discarded_with_another_chunksize(path, netcdf):
+    crashed_run(path, netcdf)
+
+    checkpoint = Checkpoint(path, chunksize=3, resume=True)
+    # Units are complete whatever the chunk size
+    assert checkpoint.unit_done("a")
+    assert checkpoint.committed_chunks("ibtracs_storms", "b") == set()
+    assert checkpoint.downloaded_file() == netcdf
+
+
+def test_discarded_with_another_file(path, netcdf):
+    crashed_run(path, netcdf)
+    with open(netcdf, "wb") as f:
+        f.write(b"netcdf v2, a new release")
+
+    checkpoint = Checkpoint(path, chunksize=2, resume=True)
+    assert checkpoint.downloaded_file() is None
+    # As run_ibtracs does when the checkpointed file can't be reused
+    checkpoint.complete_download(netcdf)
+
+    assert checkpoint.downloaded_file() == netcdf
+    assert checkpoint.stage("blob_upload") is None
+    assert not checkpoint.unit_done("a")
+    assert checkpoint.committed_chunks("ibtracs_storms", "b") == set()
+    resumed = Checkpoint(path, chunksize=2, resume=True)
+    assert not resumed.unit_done("a")
+
+
+def write_storms(storms, checkpoint):
+    return ibtracs.write_table(
+        storms,
+        engine=None,
+        table="ibtracs_storms",
+        conflict_columns=["sid"],
+        chunksize=2,
+        load_method="copy",
+        checkpoint=checkpoint,
+        unit="b",
+        changed_column="sid",
+    )
+
+
+def test_write_table_resumes_after_committed_chunks(path, netcdf, monkeypatch):
+    storms = pd.DataFrame({"sid": list("abcdefg"), "season": 2020})
+    written = []
+    failing = {"e"}
+
+    def write_chunk(df, *args):
+        if failing & set(df["sid"]):
+            raise ConnectionResetError("connection reset")
+        written.extend(df["sid"])
+        return len(df), MergeCounts(len(df), 0, 0, frozenset(df["sid"]))
+
+    monkeypatch.setattr(ibtracs, "_write_chunk", write_chunk)
+    checkpoint = Checkpoint(path, chunksize=2)
+    checkpoint.complete_download(netcdf)
+    with pytest.raises(ConnectionResetError):
+        write_storms(storms, checkpoint)
+    # Chunks after the failed one were still written
+    assert checkpoint.committed_chunks("ibtracs_storms", "b") == {0, 1, 3}
+
+    written.clear()
+    failing.clear()
+    resumed = Checkpoint(path, chunksize=2, resume=True)
+    changed = write_storms(storms, resumed)
+
+    assert written == ["e", "f"]
+    assert resumed.committed_chunks("ibtracs_storms", "b") == {0, 1, 2, 3}
+    # Rows committed by the failed run may have changed too
+    assert changed is None
+
+    resumed.complete_unit("b")
+    assert Checkpoint(path, chunksize=2, resume=True).unit_done("b")
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.pipelines.download import (
+    commit_manifest,
+    conditional_download,
+    read_manifest,
+)
+
+
+class Source:
+    """
+    Content served by the local server, with an ETag derived from it
+    """
+
+    def __init__(self, body):
+        self.body = body
+        self.version = 1
+        self.requests = []
+
+    @property
+    def etag(self):
+        return f'"{hashlib.md5(self.body).hexdigest()}-{self.version}"'
+
+
+@pytest.fixture
+def server():
+    source = Source(b"netcdf v1")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            source.requests.append(dict(self.headers))
+            if self.headers.get("If-None-Match") == source.etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", source.etag)
+            self.send_header("Content-Length", str(len(source.body)))
+            self.end_headers()
+            self.wfile.write(source.body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/file.nc", source
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_then_not_modified(server, tmp_path):
+    url, source = server
+    path = str(tmp_path / "file.nc")
+
+    assert conditional_download(url, path)
+    assert open(path, "rb").read() == b"netcdf v1"
+    commit_manifest(path)
+    assert read_manifest(path)["etag"] == source.etag
+
+    assert not conditional_download(url, path)
+    assert source.requests[-1]["If-None-Match"] == source.etag
+
+
+def test_failed_load_is_retried(server, tmp_path):
+    url, source = server
+    path = str(tmp_path / "file.nc")
+
+    assert conditional_download(url, path)
+    # The load failed, so the manifest was never committed
+    assert read_manifest(path) == {}
+    assert read_manifest(path, pending=True)["etag"] == source.etag
+
+    assert conditional_download(url, path)
+    assert "If-None-Match" not in source.requests[-1]
+    assert commit_manifest(path)
+    assert not conditional_download(url, path)
+
+
+def test_new_release(server, tmp_path):
+    url, source = server
+    path = str(tmp_path / "file.nc")
+    assert conditional_download(url, path)
+    commit_manifest(path)
+
+    source.body = b"netcdf v2"
+    assert conditional_download(url, path)
+    assert open(path, "rb").read() == b"netcdf v2"
+    assert (
+        read_manifest(path)["sha256"]
+        == hashlib.sha256(b"netcdf v1").hexdigest()
+    )
+    commit_manifest(path)
+    assert (
+        read_manifest(path)["sha256"]
+        == hashlib.sha256(b"netcdf v2").hexdigest()
+    )
+
+
+def test_republished_identical_content(server, tmp_path):
+    url, source = server
+    path = str(tmp_path / "file.nc")
+    assert conditional_download(url, path)
+    commit_manifest(path)
+
+    # Same bytes under a new ETag
+    source.version += 1
+    assert not conditional_download(url, path)
+    assert read_manifest(path)["etag"] == source.etag
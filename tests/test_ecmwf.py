@@ -0,0 +1,78 @@
+import logging
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.pipelines.ecmwf import MS_TO_KNOTS, iter_parsed_batches, parse_cxml
+
+SAMPLE = Path(__file__).parent / "fixtures" / "tigge_sample.xml"
+
+
+@pytest.fixture(scope="module")
+def tracks():
+    return parse_cxml(SAMPLE)
+
+
+def test_named_storms_only(tracks):
+    assert sorted(tracks["storm_id"].unique()) == [
+        "alice_si_2021",
+        "laura_na_2020",
+    ]
+    assert set(tracks["name"]) == {"ALICE", "LAURA"}
+
+
+def test_analyses_skipped(tracks):
+    assert set(tracks["provider"]) == {"ECMWF-HRES", "ECMWF-ENS"}
+
+
+def test_units(tracks):
+    hres = tracks[tracks["provider"].eq("ECMWF-HRES")].set_index("valid_time")
+    laura = hres[hres["storm_id"].eq("laura_na_2020")]
+    # The fix without a wind speed is dropped
+    assert list(laura.index) == list(
+        pd.to_datetime(["2020-08-26 00:00", "2020-08-26 06:00"])
+    )
+    assert laura["wind_speed"].tolist() == [round(40.0 * MS_TO_KNOTS, 1), 80]
+    assert laura["pressure"].iloc[0] == 960
+    assert pd.isna(laura["pressure"].iloc[1])
+
+
+def test_coordinate_signs(tracks):
+    hres = tracks[tracks["provider"].eq("ECMWF-HRES")]
+    laura = hres[hres["storm_id"].eq("laura_na_2020")]
+    # Degrees west and degrees east past 180 are both negative
+    assert laura["longitude"].tolist() == pytest.approx([-85.0, -84.4])
+    assert laura["latitude"].tolist() == pytest.approx([25.0, 25.6])
+
+    alice = tracks[tracks["storm_id"].eq("alice_si_2021")].iloc[0]
+    assert alice["latitude"] == -15.0
+    assert alice["longitude"] == 60.0
+    assert alice["basin"] == "SI"
+
+
+def test_ensemble_members(tracks):
+    ens = tracks[tracks["provider"].eq("ECMWF-ENS")]
+    assert sorted(ens["ensemble_member"]) == [1, 2]
+    assert ens["wind_speed"].tolist() == [
+        round(38.0 * MS_TO_KNOTS, 1),
+        round(41.0 * MS_TO_KNOTS, 1),
+    ]
+    hres = tracks[tracks["provider"].eq("ECMWF-HRES")]
+    assert set(hres["ensemble_member"]) == {0}
+
+
+def test_unreadable_files_skipped(tmp_path, caplog):
+    broken = tmp_path / "broken.xml"
+    broken.write_text("<cxml><header>")
+    files = [str(broken), str(SAMPLE), str(broken)]
+
+    with caplog.at_level(logging.WARNING):
+        batches = list(iter_parsed_batches(files, processes=1, batch_size=2))
+
+    assert len(batches) == 1
+    pd.testing.assert_frame_equal(
+        batches[0], parse_cxml(SAMPLE).reset_index(drop=True)
+    )
+    skipped = [r for r in caplog.records if "Skipping" in r.getMessage()]
+    assert len(skipped) == 2
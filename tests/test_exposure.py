@@ -0,0 +1,124 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from src.pipelines.exposure import (
+    CELL_SIZE,
+    GRID_COLUMNS,
+    GRID_ROWS,
+    STEP_KM,
+    cell_centers,
+    cell_index,
+    cells_near,
+    exposure_index,
+    haversine_km,
+    interpolate_tracks,
+)
+
+
+def tracks(fixes):
+    """
+    Tracks of (sid, hours, lon, lat, wind) fixes
+    """
+    sid, hours, lon, lat, wind = zip(*fixes)
+    return gpd.GeoDataFrame(
+        {
+            "sid": sid,
+            "valid_time": pd.Timestamp("2020-08-26")
+            + pd.to_timedelta(hours, "h"),
+            "wind_speed": pd.array(wind, dtype="Int64"),
+        },
+        geometry=gpd.points_from_xy(lon, lat),
+    )
+
+
+def test_interpolate_tracks():
+    # Fixes out of order, one duplicated, about 111 km apart
+    points = interpolate_tracks(
+        tracks(
+            [
+                ("a", 6, 1, 0, 60),
+                ("a", 0, 0, 0, 40),
+                ("a", 6, 1, 0, 60),
+                ("b", 0, 10, 10, 30),
+            ]
+        )
+    )
+    a = points[points["sid"] == "a"]
+
+    assert len(a) == np.ceil(haversine_km(0, 0, 1, 0) / STEP_KM) + 1
+    assert (a["lat"] == 0).all()
+    assert a["lon"].is_monotonic_increasing
+    assert (a["lon"].iloc[[0, -1]] == [0, 1]).all()
+    gaps = haversine_km(
+        a["lon"][:-1].to_numpy(), 0, a["lon"][1:].to_numpy(), 0
+    )
+    assert gaps.max() <= STEP_KM
+    # Wind is interpolated along with the position
+    np.testing.assert_allclose(a["wind"], 40 + 20 * a["lon"])
+    # A storm isn't joined to the next one
+    assert points[points["sid"] == "b"][["lon", "lat"]].values.tolist() == [
+        [10, 10]
+    ]
+
+
+def test_interpolate_tracks_across_the_antimeridian():
+    points = interpolate_tracks(
+        tracks([("a", 0, 179.95, 0, 40), ("a", 3, -179.95, 0, np.nan)])
+    )
+
+    assert len(points) == 4
+    assert (points["lon"].abs() >= 179.95).all()
+    # Without the wind at the next fix, only the first fix has one
+    assert points["wind"].tolist()[0] == 40
+    assert points["wind"][1:].isna().all()
+
+
+def test_cell_index():
+    assert cell_index(-180, -90) == 0
+    assert cell_index(-179.95, -89.95) == 0
+    assert cell_index(-179.85, -89.95) == 1
+    assert cell_index(-180, -89.85) == GRID_COLUMNS
+    assert cell_index(179.99, 89.99) == GRID_ROWS * GRID_COLUMNS - 1
+    # The antimeridian wraps around, the poles are in the last rows
+    assert cell_index(180, 0) == cell_index(-180, 0)
+    assert cell_index(0, 90) == cell_index(0, 89.99)
+
+    cells = np.array([0, 1, GRID_COLUMNS, GRID_ROWS * GRID_COLUMNS - 1])
+    np.testing.assert_array_equal(cell_index(*cell_centers(cells)), cells)
+
+
+def test_exposure_index():
+    exposure = exposure_index(
+        tracks([("a", 0, 0.01, 0.05, 40), ("a", 6, 0.39, 0.05, 80)])
+    )
+    equator = (90 / CELL_SIZE) * GRID_COLUMNS + 180 / CELL_SIZE
+
+    assert exposure["cell"].tolist() == [equator + i for i in range(4)]
+    assert (exposure["sid"] == "a").all()
+    # The track passes through the cells' centers, between two points
+    assert (exposure["min_distance_km"] <= STEP_KM / 2).all()
+    assert exposure["max_wind"].is_monotonic_increasing
+    assert exposure["max_wind"].iloc[-1] == 80
+
+
+def test_cells_near():
+    cells = cells_near(0.05, 0.05, 20)
+    center_lon, center_lat = cell_centers(cells)
+
+    assert cell_index(0.05, 0.05) in cells
+    assert (haversine_km(0.05, 0.05, center_lon, center_lat) <= 20).all()
+    assert len(cells) == len(np.unique(cells))
+    # Whole ring of cells around the point, including the diagonals
+    assert {
+        cell_index(0.05 + dx, 0.05 + dy)
+        for dx in (-0.1, 0.1)
+        for dy in (-0.1, 0.1)
+    } <= set(cells)
+
+    # Across the antimeridian
+    west = cells_near(179.95, 0.05, 20)
+    assert cell_index(-179.95, 0.05) in west
+    # Near a pole, cells at every longitude
+    polar = cells_near(0, 89.95, 20)
+    assert len(np.unique(polar % GRID_COLUMNS)) == GRID_COLUMNS
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_ibtracs
+from src.pipelines.fingerprint import (
+    compute_fingerprints,
+    save_fingerprints,
+    select_changed_storms,
+)
+from src.schemas.database import execute_sql_file
+
+
+def revised(dataset, storm):
+    """
+    Copy of `dataset` where the wind of `storm` was revised
+    """
+    dataset = dataset.copy(deep=True)
+    dataset["usa_wind"][storm, 0] += 5
+    return dataset
+
+
+def test_fingerprints_only_change_with_the_storm():
+    dataset = make_ibtracs(n_storms=4, points_per_storm=8)
+    fingerprints = compute_fingerprints(dataset)
+
+    assert list(fingerprints.index) == [
+        sid.decode() for sid in dataset["sid"].values
+    ]
+    assert fingerprints.is_unique
+    assert compute_fingerprints(dataset).equals(fingerprints)
+
+    changed = compute_fingerprints(revised(dataset, 1)) != fingerprints
+    assert changed.tolist() == [False, True, False, False]
+
+
+@pytest.mark.postgis
+def test_select_changed_storms(postgis_engine):
+    engine = postgis_engine
+    execute_sql_file(engine, "ibtracs_fingerprints")
+    dataset = make_ibtracs(n_storms=4, points_per_storm=8)
+    # The previous run loaded the first three storms
+    save_fingerprints(
+        compute_fingerprints(dataset.isel(storm=[0, 1, 2])), engine
+    )
+
+    # Storm 1 was revised since, and storm 3 is new
+    dataset = revised(dataset, 1)
+    fingerprints = compute_fingerprints(dataset)
+    batch, changed = select_changed_storms(dataset, fingerprints, engine)
+
+    sids = fingerprints.index[[1, 3]]
+    assert list(changed.index) == list(sids)
+    assert [sid.decode() for sid in batch["sid"].values] == list(sids)
+    np.testing.assert_array_equal(
+        batch["usa_wind"].values, dataset["usa_wind"].values[[1, 3]]
+    )
+
+    save_fingerprints(changed, engine)
+    batch, changed = select_changed_storms(dataset, fingerprints, engine)
+    assert batch.sizes["storm"] == 0
+    assert changed.empty
@@ -0,0 +1,169 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from sqlalchemy import text
+
+from benchmarks.synthetic import make_ibtracs
+from src.pipelines import ibtracs
+from src.pipelines.aggregates import AGGREGATE_COLUMNS
+from src.pipelines.ibtracs import (
+    compact_dtypes,
+    extract_batch,
+    open_ibtracs,
+    select_dataset_type,
+    select_dataset_types,
+)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "IBTrACS.ALL.v04r01.nc"
+    make_ibtracs(n_storms=6, points_per_storm=8, path=str(path))
+    return open_ibtracs(str(path))
+
+
+def test_extract_batch(dataset):
+    storms, tracks = extract_batch(dataset)
+
+    assert len(storms) == 6
+    assert len(tracks) == 6 * 8
+    assert storms["peak_wind"].notna().all()
+    assert tracks["basin"].dtype == "category"
+
+
+def test_extract_batch_without_tracks(dataset):
+    # Early seasons have neither best nor provisional tracks, and ocha-lens
+    # returns frames of untyped columns for them
+    for agency in ["wmo_agency", "usa_agency"]:
+        dataset[agency] = dataset[agency].where(False, b"")
+    dataset["track_type"] = dataset["track_type"].where(False, b"main")
+
+    storms, tracks = extract_batch(dataset)
+
+    assert len(storms) == 6
+    assert tracks.empty
+    assert storms[AGGREGATE_COLUMNS].isna().all().all()
+
+
+def storms(rows):
+    """
+    ALL Dataset of (season, track_type, last fix) storms
+    """
+    seasons, track_types, last_fixes = zip(*rows)
+    time = np.full((len(rows), 3), np.datetime64("NaT"), "datetime64[ns]")
+    time[:, 0] = pd.to_datetime(last_fixes) - pd.Timedelta(hours=6)
+    time[:, 1] = pd.to_datetime(last_fixes)
+    return xr.Dataset(
+        {
+            "season": ("storm", np.array(seasons, "int16")),
+            "track_type": ("storm", np.array(track_types, "S11")),
+        },
+        coords={"time": (("storm", "date_time"), time)},
+    )
+
+
+SUBSETS = storms(
+    [
+        (2019, b"main", "2019-09-01"),
+        (2021, b"main", "2021-09-01"),
+        (2022, b"PROVISIONAL", "2022-10-01"),
+        (2023, b"PROVISIONAL", "2023-01-01"),
+        (2023, b"main", "2023-01-10"),
+        (2024, b"PROVISIONAL", "2023-12-30"),
+        (2024, b"PROVISIONAL", "2024-01-06"),
+    ]
+)
+
+
+def test_select_dataset_type():
+    def selected(dataset_type):
+        return select_dataset_type(SUBSETS, dataset_type).tolist()
+
+    assert selected("ALL") == [0, 1, 2, 3, 4, 5, 6]
+    # The last three seasons, whatever the fixes' dates
+    assert selected("last3years") == [2, 3, 4, 5, 6]
+    # Provisional tracks with a fix in the week before the latest one
+    assert selected("ACTIVE") == [5, 6]
+    # Basin subsets aren't derived from ALL
+    with pytest.raises(ValueError):
+        select_dataset_type(SUBSETS, "NA")
+
+
+def test_select_dataset_types():
+    # Each storm once, in the order of the subsets
+    def selected(*dataset_types):
+        return select_dataset_types(SUBSETS, dataset_types).tolist()
+
+    assert selected("ACTIVE", "last3years") == [5, 6, 2, 3, 4]
+    assert selected("last3years", "ALL") == [2, 3, 4, 5, 6, 0, 1]
+
+
+def test_compact_empty_frame():
+    df = pd.DataFrame(
+        {col: pd.Series([], dtype=object) for col in ["sid", "wind_speed"]}
+    )
+    compact = compact_dtypes(df.copy())
+    assert compact.dtypes.to_dict() == df.dtypes.to_dict()
+
+
+@pytest.mark.postgis
+def test_resume_skips_completed_units(postgis_engine, tmp_path, monkeypatch):
+    save_dir = str(tmp_path)
+    make_ibtracs(
+        n_storms=6,
+        points_per_storm=8,
+        path=os.path.join(save_dir, "IBTrACS.ALL.v04r01.nc"),
+    )
+    monkeypatch.setattr(
+        ibtracs.stratus, "get_engine", lambda **kwargs: postgis_engine
+    )
+    loaded = []
+    failing = [True]
+    load_unit = ibtracs.load_unit
+
+    def load_and_fail(storms, *args, **kwargs):
+        # The run fails on its second batch of storms
+        if failing and len(loaded) == 2:
+            raise ConnectionResetError("connection reset")
+        loaded.extend(storms["sid"])
+        return load_unit(storms, *args, **kwargs)
+
+    monkeypatch.setattr(ibtracs, "load_unit", load_and_fail)
+    with pytest.raises(ConnectionResetError):
+        ibtracs.run_ibtracs("dev", "ALL", save_dir=save_dir, batch_size=2)
+    assert len(loaded) == 2
+
+    failing.clear()
+    ibtracs.run_ibtracs(
+        "dev", "ALL", save_dir=save_dir, batch_size=2, resume=True
+    )
+
+    # The batch loaded before the failure isn't loaded again
+    assert sorted(loaded) == sorted(set(loaded))
+    assert len(loaded) == 6
+    with postgis_engine.connect() as conn:
+        storms = conn.execute(
+            text("SELECT count(*) FROM storms.ibtracs_storms")
+        ).scalar()
+    assert storms == 6
+    assert not [name for name in os.listdir(save_dir) if "checkpoint" in name]
+
+
+def test_unchanged_source_skips_migrations(tmp_path, monkeypatch):
+    executed = []
+    monkeypatch.setattr(
+        ibtracs.stratus, "get_engine", lambda **kwargs: object()
+    )
+    monkeypatch.setattr(
+        ibtracs, "download_ibtracs_file", lambda *args, **kwargs: None
+    )
+    monkeypatch.setattr(
+        ibtracs, "execute_sql_file", lambda engine, name: executed.append(name)
+    )
+
+    ibtracs.run_ibtracs("dev", "ALL", save_dir=str(tmp_path), conditional=True)
+
+    assert executed == []
@@ -0,0 +1,29 @@
+import time
+
+import numpy as np
+
+from src.pipelines.metrics import span, start_run
+
+
+def test_rss_is_attributed_to_the_stage_using_it():
+    run = start_run("test")
+    with span("allocate"):
+        block = np.ones(2**25)
+        time.sleep(0.2)
+        del block
+    with span("allocate_again"):
+        block = np.ones(2**25)
+        time.sleep(0.2)
+        del block
+    with span("idle"):
+        time.sleep(0.2)
+    run.finish()
+
+    stages = {s["stage"]: s for s in run.stages()}
+    size = 2**25 * 8
+    assert stages["allocate"]["rss_growth_bytes"] > size / 2
+    # Below the high-water mark, but the sampled peak still shows it
+    assert stages["allocate_again"]["rss_growth_bytes"] < size / 2
+    assert stages["allocate_again"]["rss_peak_bytes"] > (
+        stages["idle"]["rss_peak_bytes"] + size / 2
+    )
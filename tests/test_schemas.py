@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.normalize import (
+    QUADRANT_COLUMNS,
+    legacy_normalize,
+    normalize,
+    observed_tracks_frame,
+)
+
+
+def test_normalize_matches_legacy():
+    df = observed_tracks_frame(100)
+    # Cells the legacy apply also turned into empty lists
+    df.loc[:4, "quadrant_radius_34"] = pd.Series(
+        [(1, 2, 3, 4), np.array([1.0, 2.0, 3.0, 4.0]), "NA", 0, None],
+        dtype=object,
+    )
+
+    normalized = normalize(df)
+
+    pd.testing.assert_frame_equal(
+        normalized, legacy_normalize(df), check_dtype=False
+    )
+    assert normalized["quadrant_radius_34"][:5].tolist() == [[]] * 5
+    assert normalized["nature"].isna().any()
+    assert df["quadrant_radius_34"][0] == (1, 2, 3, 4)
+
+
+def test_normalize_empty_lists_are_distinct():
+    df = pd.DataFrame({col: [np.nan, None] for col in QUADRANT_COLUMNS})
+
+    normalized = normalize(df)
+
+    cells = [cell for col in QUADRANT_COLUMNS for cell in normalized[col]]
+    assert cells == [[]] * len(cells)
+    cells[0].append(34)
+    assert [len(cell) for cell in cells[1:]] == [0] * (len(cells) - 1)
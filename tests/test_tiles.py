@@ -0,0 +1,138 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from src.pipelines.tiles import (
+    changed_extents,
+    get_tile,
+    invalidate_tiles,
+    lonlat_to_tile,
+    tile_path,
+    tile_range,
+)
+from src.pipelines.track_lines import build_track_lines
+from src.schemas.database import execute_sql_file
+
+
+def extents(rows):
+    return pd.DataFrame(
+        rows, columns=["sid", "xmin", "ymin", "xmax", "ymax", "version"]
+    ).set_index("sid")
+
+
+def cache_tiles(cache_dir, tiles):
+    for z, x, y in tiles:
+        path = Path(tile_path(cache_dir, z, x, y))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"mvt")
+
+
+def cached_tiles(cache_dir):
+    return sorted(
+        tuple(int(part) for part in p.with_suffix("").parts[-3:])
+        for p in cache_dir.rglob("*.mvt")
+    )
+
+
+def test_tile_range_rows_count_from_the_north():
+    assert tile_range((-180, -85, 180, 85), 0) == ((0, 0), (0, 0))
+    assert tile_range((-180, -85, 180, 85), 2) == ((0, 3), (0, 3))
+    # North Atlantic: western half, row just north of the equator
+    assert tile_range((-80, 10, -20, 40), 2) == ((1, 1), (1, 1))
+    assert tile_range((-80, -40, -20, -10), 2) == ((1, 1), (2, 2))
+
+
+def test_tile_range_clamped_to_the_map():
+    assert tile_range((-200, -90, 200, 90), 1) == ((0, 1), (0, 1))
+    # On the equator and the antimeridian, tiles to the south and east
+    assert tile_range((179.99, 0, 180, 0.01), 3) == ((7, 7), (3, 4))
+
+
+def test_changed_extents():
+    before = extents(
+        [
+            ("same", 0, 0, 1, 1, "v1"),
+            ("moved", 10, 10, 11, 11, "v1"),
+            ("gone", 20, 20, 21, 21, "v1"),
+        ]
+    )
+    after = extents(
+        [
+            ("same", 0, 0, 1, 1, "v1"),
+            ("moved", 12, 12, 13, 13, "v2"),
+            ("new", 30, 30, 31, 31, "v1"),
+        ]
+    )
+
+    assert sorted(changed_extents(before, after)) == [
+        (10, 10, 11, 11),
+        (12, 12, 13, 13),
+        (20, 20, 21, 21),
+        (30, 30, 31, 31),
+    ]
+    assert changed_extents(after, after) == []
+
+
+def test_invalidate_tiles(tmp_path):
+    cache_dir = tmp_path / "tiles"
+    cache_tiles(cache_dir, [(0, 0, 0), (2, 1, 1), (2, 1, 2), (2, 3, 3)])
+    (cache_dir / "2" / "1" / "1.mvt.1234.part").write_bytes(b"partial")
+
+    deleted = invalidate_tiles(str(cache_dir), [(-80, 10, -20, 40)])
+
+    assert deleted == 2
+    assert cached_tiles(cache_dir) == [(2, 1, 2), (2, 3, 3)]
+    assert (cache_dir / "2" / "1" / "1.mvt.1234.part").exists()
+
+
+def test_invalidate_tiles_without_cache(tmp_path):
+    assert invalidate_tiles(str(tmp_path / "missing"), [(0, 0, 1, 1)]) == 0
+    assert invalidate_tiles(str(tmp_path), []) == 0
+
+
+STORM_SQL = """
+INSERT INTO storms.ibtracs_storms
+    (sid, number, season, name, genesis_basin, provisional, peak_wind)
+VALUES ('2020233N14313', 13, 2020, 'LAURA', 'NA', false, 130)
+"""
+
+TRACK_SQL = """
+INSERT INTO storms.ibtracs_tracks_geo
+    (sid, storm_id, provider, basin, valid_time, wind_speed,
+     quadrant_radius_34, point_id, geometry)
+SELECT
+    '2020233N14313', 'laura_na_2020', 'usa', 'NA',
+    '2020-08-26'::timestamp + i * interval '6 hours', 100 + i,
+    '[]', i::text, ST_SetSRID(ST_MakePoint(-85 + i, 24 + i), 4326)
+FROM generate_series(0, 4) AS i
+"""
+
+
+@pytest.mark.postgis
+def test_render_and_cache_tiles(postgis_engine, tmp_path):
+    engine = postgis_engine
+    with engine.begin() as conn:
+        conn.execute(text(STORM_SQL))
+        conn.execute(text(TRACK_SQL))
+    execute_sql_file(engine, "ibtracs_track_lines")
+    build_track_lines(engine, ["2020233N14313"])
+
+    cache_dir = str(tmp_path / "tiles")
+    x, y = lonlat_to_tile(-83, 26, 2)
+    tile = get_tile(engine, 2, x, y, cache_dir)
+    assert b"tracks" in tile and b"LAURA" in tile
+    assert b"points" not in tile
+    assert get_tile(engine, 2, (x + 2) % 4, y, cache_dir) == b""
+
+    x, y = lonlat_to_tile(-83, 26, 6)
+    assert b"points" in get_tile(engine, 6, x, y, cache_dir)
+
+    # Cached tiles are served until invalidated
+    x, y = lonlat_to_tile(-83, 26, 2)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM storms.ibtracs_track_lines"))
+    assert get_tile(engine, 2, x, y, cache_dir) == tile
+    invalidate_tiles(cache_dir, [(-85, 24, -81, 28)])
+    assert b"tracks" not in get_tile(engine, 2, x, y, cache_dir)